@@ -0,0 +1,153 @@
+"""
+Admission control for LLM-bound endpoints.
+
+Two checks run before a request may call Gemini:
+
+1. A per-client token bucket (in-process, or shared through a Django cache
+   that all workers can see, 'shared' by default).
+   Clients that run out of tokens get a fast 429.
+2. A global cap on concurrent LLM calls in this process. Requests over the cap
+   are not queued; the view answers them with regex-only detection instead.
+
+Counters for admitted, shed (429) and degraded requests are kept per process
+and exposed through AdmissionController.stats().
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULTS = {
+    'RATE': 0.5,            # tokens refilled per second, per client
+    'BURST': 10,            # bucket size
+    'BACKEND': 'local',     # 'local' (per process) or 'cache' (shared via Django cache)
+    'CACHE': 'shared',      # cache alias for BACKEND 'cache'; must be shared across processes
+    'MAX_CONCURRENT': 4,    # concurrent LLM calls per process
+}
+
+
+class LocalBuckets:
+    """Token buckets kept in this process."""
+
+    # Drop refilled buckets every this many takes
+    SWEEP_EVERY = 1024
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def _sweep(self, now):
+        """Forget clients whose bucket is full again (same as a new bucket)."""
+        self._buckets = {
+            client: (tokens, last) for client, (tokens, last) in self._buckets.items()
+            if tokens + (now - last) * self.rate < self.burst
+        }
+
+    def take(self, client):
+        """Take one token; returns seconds to wait (0.0 when admitted)."""
+        now = time.monotonic()
+        with self._lock:
+            self._takes += 1
+            if self._takes % self.SWEEP_EVERY == 0:
+                self._sweep(now)
+            tokens, last = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1.0:
+                self._buckets[client] = (tokens - 1.0, now)
+                return 0.0
+            self._buckets[client] = (tokens, now)
+            return (1.0 - tokens) / self.rate
+
+
+class CacheBuckets:
+    """
+    Token buckets stored in a Django cache. All workers share them only if
+    the cache alias is shared between processes (file, Redis, Memcached; not
+    LocMemCache). The read-modify-write is not atomic across processes, so a
+    client can occasionally get a few extra tokens under contention.
+    """
+
+    def __init__(self, rate, burst, prefix='myapp:bucket:', cache_alias='shared'):
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+        self.cache = caches[cache_alias]
+        # Idle buckets expire once they would be full again
+        self.timeout = int(burst / rate) + 1
+
+    def take(self, client):
+        key = self.prefix + client
+        now = time.time()
+        tokens, last = self.cache.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + max(0.0, now - last) * self.rate)
+        if tokens >= 1.0:
+            self.cache.set(key, (tokens - 1.0, now), self.timeout)
+            return 0.0
+        self.cache.set(key, (tokens, now), self.timeout)
+        return (1.0 - tokens) / self.rate
+
+
+class AdmissionController:
+    """Per-client rate limiting plus a global LLM concurrency cap."""
+
+    def __init__(self, rate, burst, backend='local', max_concurrent=4, cache_alias='shared'):
+        if backend == 'cache':
+            self.buckets = CacheBuckets(rate, burst, cache_alias=cache_alias)
+        else:
+            self.buckets = LocalBuckets(rate, burst)
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._counters = {'admitted': 0, 'shed': 0, 'degraded': 0}
+        self._in_flight = 0
+
+    @classmethod
+    def from_settings(cls, name):
+        config = {**DEFAULTS, **getattr(settings, name, {})}
+        return cls(config['RATE'], config['BURST'], config['BACKEND'], config['MAX_CONCURRENT'], config['CACHE'])
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def check_rate(self, request):
+        """Returns seconds the client must wait, 0.0 if the request may proceed."""
+        wait = self.buckets.take(client_key(request))
+        if wait > 0:
+            self._count('shed')
+        return wait
+
+    def acquire_slot(self):
+        """Try to claim an LLM slot without blocking; counts a degraded request on failure."""
+        if not self._slots.acquire(blocking=False):
+            self._count('degraded')
+            return False
+        with self._lock:
+            self._counters['admitted'] += 1
+            self._in_flight += 1
+        return True
+
+    def release_slot(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                'in_flight': self._in_flight,
+                'max_concurrent': self.max_concurrent,
+            }
+
+
+def client_key(request):
+    """Identify the client: the logged-in user, else the remote address."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return 'ip:' + request.META.get('REMOTE_ADDR', 'unknown')
@@ -0,0 +1,107 @@
+"""
+Hierarchical school / department DP releases.
+
+Each level is computed with one GROUP BY query and all of its statistics
+are noised in a single batched draw. Department totals are then made
+consistent with their school totals, so departments roll up to schools.
+The whole release is cached until the data version changes.
+"""
+import numpy as np
+from django.core.cache import cache
+
+from . import dp
+from .models import ITEM
+from .versioning import get_data_version
+
+# Cached releases are kept for a day at most, even without new data
+RELEASE_TIMEOUT = 60 * 60 * 24
+
+# Privacy loss per statistic per level (a review touches one node per level)
+LEVEL_EPSILON = dp.AVERAGE_EPSILON / 2
+
+# Statistic -> L1 sensitivity of its per-node total
+_TOTALS = {
+    'n': 1.0,
+    'rating_sum': dp.RATING_BOUNDS[1],
+    'difficulty_sum': dp.DIFFICULTY_BOUNDS[1],
+    'helpful_sum': dp.HELPFUL_BOUNDS[1],
+    'take_again': 1.0,
+}
+
+
+def _noisy_totals(stats, rng):
+    """Noise every total of one level in a single draw."""
+    names = list(_TOTALS)
+    values = np.stack([stats[name].astype(np.float64) for name in names])
+    scales = np.array([_TOTALS[name] / LEVEL_EPSILON for name in names])[:, None]
+    noisy = values + dp.laplace_noise(np.broadcast_to(scales, values.shape), rng=rng)
+    return dict(zip(names, noisy))
+
+
+def _rows(labels, totals):
+    """Turn consistent noisy totals into display rows."""
+    n = np.maximum(totals['n'], 1.0)
+    rating = np.clip(totals['rating_sum'] / n, *dp.RATING_BOUNDS)
+    difficulty = np.clip(totals['difficulty_sum'] / n, *dp.DIFFICULTY_BOUNDS)
+    helpful = np.clip(totals['helpful_sum'] / n, *dp.HELPFUL_BOUNDS)
+    take_again = np.clip(100.0 * totals['take_again'] / n, 0.0, 100.0)
+    return [
+        {
+            **label,
+            'total_reviews': max(0, int(round(totals['n'][i]))),
+            'average_rating': round(float(rating[i]), 1),
+            'average_difficulty': round(float(difficulty[i]), 1),
+            'average_help_useful': round(float(helpful[i]), 1),
+            'would_take_again_percent': int(round(take_again[i])),
+        }
+        for i, label in enumerate(labels)
+    ]
+
+
+def compute_school_release(queryset=None, rng=None):
+    """
+    Release noisy aggregates for every school and every department.
+
+    Returns {'schools': [row, ...], 'departments': {school_name: [row, ...]}}.
+    """
+    if queryset is None:
+        queryset = ITEM.objects.all()
+    rng = rng or np.random.default_rng()
+
+    schools = dp.group_stats(queryset, ['school_name'])
+    departments = dp.group_stats(queryset, ['school_name', 'department_name'])
+
+    school_index = {name: i for i, name in enumerate(schools['school_name'])}
+    parent_index = np.array([school_index[s] for s in departments['school_name']], dtype=np.int64)
+
+    school_noisy = _noisy_totals(schools, rng)
+    dept_noisy = _noisy_totals(departments, rng)
+    for name in _TOTALS:
+        school_noisy[name], dept_noisy[name] = dp.consistent_two_level(
+            school_noisy[name], dept_noisy[name], parent_index
+        )
+
+    school_rows = _rows([{'school_name': s} for s in schools['school_name']], school_noisy)
+    dept_rows = _rows(
+        [
+            {'school_name': s, 'department_name': d}
+            for s, d in zip(departments['school_name'], departments['department_name'])
+        ],
+        dept_noisy,
+    )
+    by_school = {}
+    for row in dept_rows:
+        by_school.setdefault(row['school_name'], []).append(row)
+    for row in school_rows:
+        row['department_count'] = len(by_school.get(row['school_name'], []))
+    return {'schools': school_rows, 'departments': by_school}
+
+
+def school_release():
+    """Cached school / department release for the current data version."""
+    key = f'myapp:school_release:{get_data_version()}'
+    release = cache.get(key)
+    if release is None:
+        release = compute_school_release()
+        cache.set(key, release, timeout=RELEASE_TIMEOUT)
+    return release
@@ -0,0 +1,296 @@
+"""
+Columnar snapshot of ITEM for ad-hoc filtered DP queries.
+
+The numeric columns are NumPy arrays and professor / school / department /
+course are dictionary-encoded as int32 codes, so a question like "average
+difficulty by course for department X at school Y" is a few vectorized
+mask and bincount operations instead of a new view and a full ORM scan.
+Results are released with dp.professor_release(), i.e. the same mechanisms
+and budgets as the rest of the site; every query spends that budget again.
+
+The build_snapshot command writes the snapshot to SNAPSHOT['DIR'] as .npy
+files that workers memory-map, so they share the pages instead of each
+holding a copy. A worker loads the newest one on first use, then catches up
+incrementally whenever the data version changes (write, delete, ingest):
+rows with a higher id (per shard) are appended, and deleted ids are masked
+out. Updates
+of existing rows can't be caught up that way; they bump the rewrite version
+(see versioning.py) and the snapshot is rebuilt instead.
+
+Group sizes are released as noisy counts (COUNT_EPSILON, like the
+would-take-again counts), and groups whose noisy size is below
+MIN_GROUP_SIZE are left out, so narrow filters don't reveal exact counts.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from . import dp, sharding
+from .models import ITEM
+from .versioning import get_data_version, get_rewrite_version
+
+DEFAULTS = {
+    'DIR': None,        # defaults to BASE_DIR / 'snapshot'
+    'MMAP': True,       # memory-map the saved columns instead of reading them
+    'KEEP': 2,          # saved generations kept on disk
+    'MIN_GROUP_SIZE': 5,    # groups with a smaller noisy size are not returned
+}
+
+# Query name -> ITEM field, for the dictionary-encoded columns
+CATEGORICAL = {
+    'professor': 'professor_name',
+    'school': 'school_name',
+    'department': 'department_name',
+    'course': 'course',
+}
+# Query name -> (ITEM field, dtype) for the numeric columns
+NUMERIC = {
+    'id': ('id', np.int64),
+    'rating': ('star_rating', np.float32),
+    'difficulty': ('difficulty', np.int8),
+    'helpful': ('help_useful', np.int8),
+    'take_again': ('would_take_agains', np.bool_),
+}
+_FIELDS = [field for field, _ in NUMERIC.values()] + list(CATEGORICAL.values())
+
+
+def snapshot_config():
+    """SNAPSHOT settings merged over DEFAULTS, with DIR resolved."""
+    config = {**DEFAULTS, **getattr(settings, 'SNAPSHOT', {})}
+    if config['DIR'] is None:
+        config['DIR'] = settings.BASE_DIR / 'snapshot'
+    return config
+
+
+class Dictionary:
+    """String <-> int32 code mapping; new values get the next code."""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, values):
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+            codes[i] = code
+        return codes
+
+    def lookup(self, values):
+        """Codes of the known values (unknown values match nothing)."""
+        return np.array([self.codes[v] for v in values if v in self.codes], dtype=np.int32)
+
+
+class ColumnarSnapshot:
+    """Column arrays for every ITEM row, plus a live mask for deleted rows."""
+
+    def __init__(self, columns=None, dictionaries=None):
+        self.columns = columns or {
+            **{name: np.empty(0, dtype=dtype) for name, (_, dtype) in NUMERIC.items()},
+            **{name: np.empty(0, dtype=np.int32) for name in CATEGORICAL},
+            'live': np.empty(0, dtype=np.bool_),
+        }
+        self.dictionaries = dictionaries or {name: Dictionary() for name in CATEGORICAL}
+        self.version = None
+        # Rewrite version the rows were read under (None: unknown)
+        self.rewrite_version = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return int(self.columns['live'].sum())
+
+    @property
+    def max_id(self):
+        ids = self.columns['id']
+        return int(ids[-1]) if ids.size else 0
+
+    @classmethod
+    def build(cls, queryset=None, chunk_size=5000):
+        """Read every row once, chunk_size rows at a time."""
+        snapshot = cls()
+        # Read before the rows: a rewrite during the build triggers another one
+        snapshot.rewrite_version = get_rewrite_version()
+        rows = (queryset if queryset is not None else ITEM.objects.all()).order_by('id').values_list(*_FIELDS)
+        batch = []
+        for row in sharding.iterate(rows, chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                snapshot.extend(batch)
+                batch = []
+        snapshot.extend(batch)
+        return snapshot
+
+    def extend(self, rows):
+        """Append rows given as values_list(*_FIELDS) tuples, ordered by id."""
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        new = {}
+        for i, (name, (_, dtype)) in enumerate(NUMERIC.items()):
+            new[name] = np.array(columns[i], dtype=dtype)
+        for i, name in enumerate(CATEGORICAL, start=len(NUMERIC)):
+            new[name] = self.dictionaries[name].encode(columns[i])
+        new['live'] = np.ones(len(rows), dtype=np.bool_)
+        # Concatenating also moves memory-mapped columns into memory
+        self.columns = {name: np.concatenate([self.columns[name], new[name]]) for name in self.columns}
+
+    def refresh(self):
+        """Catch up with the database: append new rows, mask deleted ones, shard by shard."""
+        for alias in sharding.shards():
+            low, high = sharding.id_range(alias)
+            items = ITEM.objects.using(alias)
+            with transaction.atomic(using=alias):
+                known = self.columns['id'][(self.columns['id'] > low) & (self.columns['id'] <= high)]
+                self.extend(list(
+                    items.filter(id__gt=int(known.max()) if known.size else low)
+                    .order_by('id').values_list(*_FIELDS)
+                ))
+                in_shard = (self.columns['id'] > low) & (self.columns['id'] <= high)
+                if int(self.columns['live'][in_shard].sum()) != items.count():
+                    ids = np.fromiter(items.values_list('id', flat=True).iterator(), dtype=np.int64)
+                    live = np.array(self.columns['live'])
+                    live[in_shard] &= np.isin(self.columns['id'][in_shard], ids)
+                    self.columns['live'] = live
+
+    def query(self, filters=None, group_by=(), rng=None, min_group_size=0):
+        """
+        Noisy statistics of the live rows matching filters, per group.
+
+        filters maps a CATEGORICAL name to a list of accepted values, or
+        'take_again' to a bool. group_by is a list of CATEGORICAL names.
+        total_reviews is a noisy count; groups where it is below
+        min_group_size are dropped. Returns a list of dicts sorted by the
+        group labels.
+        """
+        rng = rng or np.random.default_rng()
+        with self._lock:
+            columns = self.columns
+            dictionaries = {name: list(d.values) for name, d in self.dictionaries.items()}
+            lookup = {name: d.lookup for name, d in self.dictionaries.items()}
+
+        mask = columns['live'].copy()
+        for name, wanted in (filters or {}).items():
+            if name == 'take_again':
+                mask &= columns['take_again'] == bool(wanted)
+            else:
+                mask &= np.isin(columns[name], lookup[name](wanted))
+        rows = np.flatnonzero(mask)
+
+        if group_by:
+            keys = np.stack([columns[name][rows] for name in group_by], axis=1)
+            groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        else:
+            groups = np.empty((1 if rows.size else 0, 0), dtype=np.int32)
+            inverse = np.zeros(rows.size, dtype=np.int64)
+        size = len(groups)
+
+        stats = {
+            'n': np.bincount(inverse, minlength=size).astype(np.int64),
+            'take_again': np.bincount(inverse, weights=columns['take_again'][rows], minlength=size),
+        }
+        for name in ('rating', 'difficulty', 'helpful'):
+            stats[f'{name}_sum'] = np.bincount(inverse, weights=columns[name][rows], minlength=size)
+        release = dp.professor_release(stats, rng)
+        # The exact size of a filtered group can be a sensitive count itself
+        # (e.g. take_again=1 for one professor)
+        noisy_n = np.maximum(np.round(dp.noisy_counts(stats['n'], dp.COUNT_EPSILON, rng=rng)), 0).astype(np.int64)
+
+        results = []
+        for i, codes in enumerate(groups):
+            if noisy_n[i] < min_group_size:
+                continue
+            row = {name: dictionaries[name][code] for name, code in zip(group_by, codes)}
+            row.update({
+                'total_reviews': int(noisy_n[i]),
+                'average_rating': float(release['average_rating'][i]),
+                'average_difficulty': float(release['average_difficulty'][i]),
+                'average_help_useful': float(release['average_help_useful'][i]),
+                'would_take_again_percent': int(release['would_take_again_percent'][i]),
+            })
+            results.append(row)
+        results.sort(key=lambda r: [r[name] for name in group_by])
+        return results
+
+    def save(self, directory):
+        """Write a new generation and point CURRENT at it atomically."""
+        os.makedirs(directory, exist_ok=True)
+        generation = f'gen-{time.time_ns()}'
+        path = os.path.join(directory, generation)
+        os.makedirs(path)
+        for name, column in self.columns.items():
+            np.save(os.path.join(path, f'{name}.npy'), column)
+        with open(os.path.join(path, 'dictionaries.json'), 'w') as f:
+            json.dump({name: d.values for name, d in self.dictionaries.items()}, f)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'rewrite_version': self.rewrite_version}, f)
+        pointer = os.path.join(directory, 'CURRENT')
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(generation)
+        os.replace(pointer + '.tmp', pointer)
+        return path
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """The generation CURRENT points at, or None if nothing was saved."""
+        pointer = os.path.join(directory, 'CURRENT')
+        if not os.path.exists(pointer):
+            return None
+        with open(pointer) as f:
+            path = os.path.join(directory, f.read().strip())
+        with open(os.path.join(path, 'dictionaries.json')) as f:
+            dictionaries = {name: Dictionary(values) for name, values in json.load(f).items()}
+        columns = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+            for name in [*NUMERIC, *CATEGORICAL, 'live']
+        }
+        snapshot = cls(columns, dictionaries)
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                snapshot.rewrite_version = json.load(f).get('rewrite_version')
+        return snapshot
+
+
+def prune_generations(directory, keep):
+    """Delete all but the newest `keep` saved generations."""
+    generations = sorted(name for name in os.listdir(directory) if name.startswith('gen-'))
+    for name in generations[:-keep] if keep else generations:
+        path = os.path.join(directory, name)
+        for file_name in os.listdir(path):
+            os.remove(os.path.join(path, file_name))
+        os.rmdir(path)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """
+    This process's snapshot, caught up with the current data version (and
+    rebuilt if rows were updated in place since it was read).
+    """
+    global _snapshot
+    version = get_data_version()
+    rewrite_version = get_rewrite_version()
+    with _snapshot_lock:
+        if _snapshot is None:
+            config = snapshot_config()
+            _snapshot = ColumnarSnapshot.load(str(config['DIR']), config['MMAP'])
+        if _snapshot is None or _snapshot.rewrite_version != rewrite_version:
+            _snapshot = ColumnarSnapshot.build()
+        if _snapshot.version != version:
+            snapshot = _snapshot
+            with snapshot._lock:
+                snapshot.refresh()
+                snapshot.version = version
+    return _snapshot
@@ -0,0 +1,161 @@
+"""
+Continual-release would-take-again counts (binary tree mechanism).
+
+Every review added to or deleted from a professor is one event in that
+professor's stream (+1 / -1 for a would-take-again answer, 0 otherwise).
+The stream is covered by dyadic intervals, one per tree level: each event
+updates the exact partial sums alpha and draws one fresh Laplace sample for
+the level it completes, and the current count is the sum of at most LEVELS
+stored noisy partial sums. Both are O(log T) in the stream length T.
+
+An event falls into at most LEVELS intervals, each noised with scale
+LEVELS / EPSILON, so the whole stream of counts costs EPSILON per event; a
+review that is later deleted contributes two events. Reading a count is
+post-processing and costs nothing, so counts stay fresh after every write
+without re-noising per request.
+
+When a tree is full (2**LEVELS - 1 events) its noisy total is folded into
+`base` and a new tree starts. Fewer levels mean less noise per read but more
+folded trees; the error of the folded totals accumulates.
+
+A professor without a counter (backfill_counters hasn't reached them yet)
+gets one on their first write by replaying all of their live reviews, never
+one holding just the new event. Renaming a professor (fix_spacing) rebuilds
+the counters of both names with rebuild(), which spends their budget again.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import sharding
+from .models import ITEM, TakeAgainCounter
+
+DEFAULTS = {
+    'EPSILON': 1.0,     # privacy loss per event
+    'LEVELS': 8,        # tree depth; a tree holds 2**LEVELS - 1 events
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, 'CONTINUAL_RELEASE', {})}
+
+
+class BinaryCounter:
+    """The binary mechanism over one event stream, on a TakeAgainCounter row."""
+
+    def __init__(self, row, levels, epsilon):
+        self.row = row
+        self.levels = levels
+        self.scale = levels / epsilon
+        if len(row.alpha) != levels:
+            # New row (or LEVELS changed): fold what is there and start a tree
+            row.base = self.value()
+            row.steps = 0
+            row.alpha = [0.0] * levels
+            row.noisy_alpha = [0.0] * levels
+
+    def add(self, x, rng):
+        row = self.row
+        if row.steps >= 2 ** self.levels - 1:
+            row.base = self.value()
+            row.steps = 0
+            row.alpha = [0.0] * self.levels
+            row.noisy_alpha = [0.0] * self.levels
+        t = row.steps + 1
+        # Level of the interval that ends at t: the lowest set bit of t
+        i = (t & -t).bit_length() - 1
+        row.alpha[i] = sum(row.alpha[:i]) + x
+        for j in range(i):
+            row.alpha[j] = 0.0
+            row.noisy_alpha[j] = 0.0
+        row.noisy_alpha[i] = row.alpha[i] + float(rng.laplace(0.0, self.scale))
+        row.steps = t
+
+    def value(self):
+        return noisy_count(self.row)
+
+
+def noisy_count(row):
+    """Current noisy count of a TakeAgainCounter row: O(LEVELS) additions."""
+    return row.base + sum(
+        value for level, value in enumerate(row.noisy_alpha) if row.steps >> level & 1
+    )
+
+
+def take_again_percent(count, total_reviews):
+    """Noisy count as the percentage shown on the site, within [0, 100]."""
+    if total_reviews <= 0:
+        return 0
+    return max(0, min(100, round(max(0.0, count) / total_reviews * 100)))
+
+
+def record(professor_name, events, rng=None):
+    """
+    Add +1 / -1 / 0 events to a professor's counter in one transaction.
+
+    Call it after writing the reviews, in the same transaction: a missing
+    counter is created from the live reviews, which already include them.
+    """
+    config = _config()
+    rng = rng or np.random.default_rng()
+    with transaction.atomic():
+        row = TakeAgainCounter.objects.select_for_update().filter(professor_name=professor_name).first()
+        if row is None:
+            row = replay(professor_name, rng)
+            try:
+                with transaction.atomic():
+                    row.save(force_insert=True)
+                return
+            except IntegrityError:
+                # Created concurrently: add the events to that one
+                row = TakeAgainCounter.objects.select_for_update().get(professor_name=professor_name)
+        counter = BinaryCounter(row, config['LEVELS'], config['EPSILON'])
+        for x in events:
+            counter.add(x, rng)
+        row.save()
+
+
+def replay(professor_name, rng=None):
+    """Unsaved counter replaying a professor's live reviews (on every shard) in id order."""
+    config = _config()
+    rng = rng or np.random.default_rng()
+    answers = []
+    for alias in sharding.shards():
+        answers.extend(
+            ITEM.objects.using(alias).filter(professor_name=professor_name).values_list('id', 'would_take_agains')
+        )
+    counter = BinaryCounter(TakeAgainCounter(professor_name=professor_name), config['LEVELS'], config['EPSILON'])
+    for _, would_take_again in sorted(answers):
+        counter.add(1.0 if would_take_again else 0.0, rng)
+    return counter.row
+
+
+def rebuild(professor_names, rng=None):
+    """Replace the counters of these professors with replays of their live reviews."""
+    rng = rng or np.random.default_rng()
+    professor_names = set(professor_names)
+    with transaction.atomic():
+        TakeAgainCounter.objects.filter(professor_name__in=professor_names).delete()
+        rows = [replay(name, rng) for name in professor_names]
+        TakeAgainCounter.objects.bulk_create([row for row in rows if row.steps or row.base])
+
+
+def build_counters(queryset=None, rng=None):
+    """
+    Unsaved counters replaying each professor's current reviews in id order,
+    one event per review. Yields TakeAgainCounter instances.
+    """
+    config = _config()
+    rng = rng or np.random.default_rng()
+    queryset = queryset if queryset is not None else ITEM.objects.all()
+    rows = queryset.order_by('professor_name', 'id').values_list('professor_name', 'would_take_agains')
+    current, counter = None, None
+    for professor_name, would_take_again in sharding.iterate(rows, key=lambda row: row[0]):
+        if professor_name != current:
+            if counter is not None:
+                yield counter.row
+            current = professor_name
+            counter = BinaryCounter(TakeAgainCounter(professor_name=professor_name), config['LEVELS'], config['EPSILON'])
+        counter.add(1.0 if would_take_again else 0.0, rng)
+    if counter is not None:
+        yield counter.row
@@ -0,0 +1,252 @@
+"""
+Near-duplicate review index (MinHash + LSH).
+
+Resubmissions, small edits and copy-pasted templates get the same privacy
+verdict as the original, so the verdict of an already-checked text is
+reused instead of calling Gemini again. Texts are regex-scrubbed by the
+caller, shingled into character n-grams and summarized by a MinHash
+signature; LSH banding finds candidates and the estimated Jaccard
+similarity decides whether a candidate is close enough.
+
+Two indexes are kept, one per LLM task, and each is saved to disk so it
+survives restarts:
+
+- privacy_verdicts(): check_privacy_risk results (risk_level)
+- anonymized_reviews(): make_review_private results (changed: whether
+  Gemini rewrote the text)
+
+Only verdicts are stored, never the rewritten text: a near-duplicate is
+another user's review, so its rewrite must not be shown to or saved for
+the current one.
+"""
+import json
+import os
+import tempfile
+import threading
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+DEFAULTS = {
+    'DIR': None,            # defaults to BASE_DIR / 'dedup_index'
+    'THRESHOLD': 0.9,       # minimum estimated Jaccard similarity to reuse a verdict
+    'NUM_PERM': 128,        # MinHash signature length
+    'BANDS': 16,            # LSH bands (NUM_PERM / BANDS rows per band)
+    'SHINGLE_SIZE': 5,      # characters per shingle
+    'MAX_ENTRIES': 100000,  # oldest half is dropped when full
+    'SAVE_EVERY': 20,       # write to disk after this many additions
+}
+
+# Prime just below 2**32: a * x + b stays below 2**64 for a, b, x < PRIME
+_PRIME = np.uint64(4294967291)
+
+
+def _config():
+    config = {**DEFAULTS, **getattr(settings, 'NEAR_DUPLICATE_INDEX', {})}
+    if config['DIR'] is None:
+        config['DIR'] = settings.BASE_DIR / 'dedup_index'
+    return config
+
+
+def shingles(text, size):
+    """Hashed character shingles of the normalized text, as a uint64 array."""
+    text = ' '.join(text.lower().split())
+    if len(text) <= size:
+        grams = {text}
+    else:
+        grams = {text[i:i + size] for i in range(len(text) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHashLSHIndex:
+    """MinHash signatures with LSH buckets, mapping texts to stored verdicts."""
+
+    def __init__(self, name, threshold=0.9, num_perm=128, bands=16, shingle_size=5,
+                 max_entries=100000, save_every=20, directory=None, seed=1):
+        if num_perm % bands:
+            raise ValueError('NUM_PERM must be a multiple of BANDS')
+        self.name = name
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self.path = os.path.join(directory, f'{name}.npz') if directory else None
+
+        # Fixed seed: signatures must stay comparable with the ones on disk
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._pending = []        # signatures added since the last stack
+        self._verdicts = []
+        self._buckets = {}
+        self._unsaved = 0
+        self.lookups = 0
+        self.hits = 0             # Gemini calls avoided (record_reuse())
+
+    def signature(self, text):
+        """MinHash signature (uint32 per permutation) of the text."""
+        x = shingles(text, self.shingle_size) % _PRIME
+        hashed = (np.outer(self._a, x) + self._b[:, None]) % _PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+    def _all_signatures(self):
+        if self._pending:
+            self._signatures = np.vstack([self._signatures] + self._pending)
+            self._pending = []
+        return self._signatures
+
+    def lookup(self, text):
+        """
+        Verdict of the most similar indexed text above the threshold, or None.
+        A match isn't counted as a hit: the caller may still call Gemini, and
+        calls record_reuse() only when it doesn't.
+        """
+        signature = self.signature(text)
+        with self._lock:
+            self.lookups += 1
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+            if not candidates:
+                return None
+            ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            similarity = (self._all_signatures()[ids] == signature).mean(axis=1)
+            best = int(similarity.argmax())
+            if similarity[best] < self.threshold:
+                return None
+            return self._verdicts[ids[best]]
+
+    def record_reuse(self):
+        """Count a lookup whose verdict was used instead of calling Gemini."""
+        with self._lock:
+            self.hits += 1
+
+    def add(self, text, verdict):
+        """Index a checked text with its verdict (a JSON-serializable dict)."""
+        signature = self.signature(text)
+        with self._lock:
+            if len(self._verdicts) >= self.max_entries:
+                self._drop_oldest()
+            entry = len(self._verdicts)
+            self._pending.append(signature[None, :])
+            self._verdicts.append(verdict)
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, []).append(entry)
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def _drop_oldest(self):
+        keep = len(self._verdicts) // 2
+        signatures = self._all_signatures()[keep:]
+        verdicts = self._verdicts[keep:]
+        self._signatures = np.empty((0, self.num_perm), dtype=np.uint32)
+        self._verdicts = []
+        self._buckets = {}
+        self._load_entries(signatures, verdicts)
+
+    def _load_entries(self, signatures, verdicts):
+        self._signatures = signatures
+        self._verdicts = list(verdicts)
+        for entry, signature in enumerate(signatures):
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, []).append(entry)
+
+    def save(self):
+        """Write the index to disk atomically."""
+        if not self.path:
+            return
+        with self._lock:
+            signatures = self._all_signatures().copy()
+            verdicts = json.dumps(self._verdicts)
+            self._unsaved = 0
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, signatures=signatures, verdicts=np.array(verdicts))
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load(self):
+        """Load the index saved by save(), if there is one."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        with np.load(self.path) as data:
+            signatures = data['signatures']
+            verdicts = json.loads(str(data['verdicts']))
+        # Indexes saved by older versions also kept the rewritten texts
+        verdicts = [{key: value for key, value in v.items() if not key.endswith('_text')} for v in verdicts]
+        if signatures.shape[1:] != (self.num_perm,):
+            # Saved with different settings; start over
+            return
+        with self._lock:
+            self._buckets = {}
+            self._pending = []
+            self._load_entries(signatures.astype(np.uint32), verdicts)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._verdicts),
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _get_index(name):
+    index = _indexes.get(name)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(name)
+            if index is None:
+                config = _config()
+                index = MinHashLSHIndex(
+                    name,
+                    threshold=config['THRESHOLD'],
+                    num_perm=config['NUM_PERM'],
+                    bands=config['BANDS'],
+                    shingle_size=config['SHINGLE_SIZE'],
+                    max_entries=config['MAX_ENTRIES'],
+                    save_every=config['SAVE_EVERY'],
+                    directory=str(config['DIR']),
+                )
+                index.load()
+                _indexes[name] = index
+    return index
+
+
+def privacy_verdicts():
+    """Index of check_privacy_risk verdicts."""
+    return _get_index('privacy_verdicts')
+
+
+def anonymized_reviews():
+    """Index of make_review_private outputs."""
+    return _get_index('anonymized_reviews')
+
+
+def stats():
+    """Hit-rate counters of the indexes loaded in this process."""
+    return {name: index.stats() for name, index in _indexes.items()}
@@ -0,0 +1,425 @@
+"""
+Batched differential privacy helpers.
+
+The per-request functions in views.py (dp_average, dp_count, ...) draw one
+Laplace sample per statistic. The helpers here work on whole arrays of
+professors at once so that evaluation, aggregate and export code can load
+sufficient statistics with one query and add noise in a single draw.
+"""
+from operator import itemgetter
+
+import numpy as np
+from django.db.models import Count, Min, Q, Sum
+
+from . import sharding
+from .models import ITEM
+
+# Bounds used for the DP averages on the site (see professor_profile)
+RATING_BOUNDS = (0.0, 5.0)
+DIFFICULTY_BOUNDS = (1.0, 5.0)
+HELPFUL_BOUNDS = (1.0, 10.0)
+
+# Default privacy loss per statistic (same values as the views)
+AVERAGE_EPSILON = 1.0
+COUNT_EPSILON = 0.1
+
+# Name of each averaged attribute -> (model field, bounds)
+AVERAGE_FIELDS = {
+    'rating': ('star_rating', RATING_BOUNDS),
+    'difficulty': ('difficulty', DIFFICULTY_BOUNDS),
+    'helpful': ('help_useful', HELPFUL_BOUNDS),
+}
+
+
+_SUM_FIELDS = ('n', 'rating_sum', 'difficulty_sum', 'helpful_sum', 'take_again')
+
+
+def stats_annotations():
+    """Aggregate expressions for the sufficient statistics of a group."""
+    return {
+        'n': Count('id'),
+        'rating_sum': Sum('star_rating'),
+        'difficulty_sum': Sum('difficulty'),
+        'helpful_sum': Sum('help_useful'),
+        'take_again': Count('id', filter=Q(would_take_agains=True)),
+    }
+
+
+def stats_rows(queryset, group_by, **extra):
+    """Grouped sufficient-statistics query (one row per group, not evaluated)."""
+    return (
+        queryset.values(*group_by)
+        .annotate(**stats_annotations(), **extra)
+        .order_by(*group_by)
+    )
+
+
+def combine_rows(rows, key, sums=_SUM_FIELDS):
+    """
+    Merge adjacent rows with the same key(row), i.e. a group split over
+    shards (see sharding.iterate()): the fields in sums are added up, the
+    others (Min() annotations) keep the smaller value. Lazy, so streamed
+    rows stay streamed.
+    """
+    current = None
+    for row in rows:
+        if current is not None and key(row) == key(current):
+            for field, value in row.items():
+                if field in sums:
+                    current[field] = (current[field] or 0) + (value or 0)
+                else:
+                    current[field] = min(current[field], value)
+            continue
+        if current is not None:
+            yield current
+        current = dict(row)
+    if current is not None:
+        yield current
+
+
+def sum_aggregates(rows):
+    """Add up aggregate() results of the same annotations from several shards."""
+    return {field: sum(row[field] or 0 for row in rows) for field in rows[0]}
+
+
+def rows_to_stats(rows, labels):
+    """Turn stats_rows() dicts into aligned arrays; labels stay object arrays."""
+    stats = {field: np.array([r[field] for r in rows], dtype=object) for field in labels}
+    stats['n'] = np.array([r['n'] for r in rows], dtype=np.int64)
+    for field in _SUM_FIELDS[1:]:
+        stats[field] = np.array([r[field] or 0 for r in rows], dtype=np.float64)
+    return stats
+
+
+def group_stats(queryset, group_by, **extra):
+    """
+    Load sufficient statistics for every group with one GROUP BY query.
+
+    Returns a dict of aligned arrays: one object array per grouping field
+    (and per extra annotation), plus 'n', 'rating_sum', 'difficulty_sum',
+    'helpful_sum' and 'take_again'.
+    """
+    key = itemgetter(*group_by)
+    rows = list(combine_rows(sharding.iterate(stats_rows(queryset, group_by, **extra), key=key), key))
+    return rows_to_stats(rows, list(group_by) + list(extra))
+
+
+def professor_stats(queryset=None):
+    """Per-professor sufficient statistics; professor names are under 'names'."""
+    if queryset is None:
+        queryset = ITEM.objects.all()
+    stats = group_stats(queryset, ['professor_name'])
+    stats['names'] = stats.pop('professor_name')
+    return stats
+
+
+def average_sensitivity(n, a, b):
+    """Sensitivity of a bounded mean over n values, (b - a) / n, elementwise."""
+    n = np.maximum(np.asarray(n, dtype=np.float64), 1.0)
+    return (b - a) / n
+
+
+def laplace_scale(sensitivity, epsilon):
+    """Laplace mechanism scale for the given sensitivity and epsilon."""
+    return np.asarray(sensitivity, dtype=np.float64) / epsilon
+
+
+def gaussian_sigma(sensitivity, epsilon, delta):
+    """Standard deviation of the classic (epsilon, delta) Gaussian mechanism."""
+    return np.asarray(sensitivity, dtype=np.float64) * np.sqrt(2.0 * np.log(1.25 / delta)) / epsilon
+
+
+def laplace_noise(scale, size=None, rng=None):
+    """Vectorized Laplace noise with per-element scale."""
+    rng = rng or np.random.default_rng()
+    return rng.laplace(0.0, 1.0, size=size if size is not None else np.shape(scale)) * scale
+
+
+def gaussian_noise(sigma, size=None, rng=None):
+    """Vectorized Gaussian noise with per-element standard deviation."""
+    rng = rng or np.random.default_rng()
+    return rng.standard_normal(size=size if size is not None else np.shape(sigma)) * sigma
+
+
+def noisy_averages(sums, n, a, b, epsilon, rng=None, clamp=True):
+    """
+    Release a noisy bounded mean for every group in one Laplace draw.
+    Returns (noisy_avg, true_avg) arrays.
+    """
+    n = np.asarray(n, dtype=np.float64)
+    true_avg = np.divide(sums, n, out=np.zeros_like(n), where=n > 0)
+    scale = laplace_scale(average_sensitivity(n, a, b), epsilon)
+    noisy_avg = true_avg + laplace_noise(scale, rng=rng)
+    if clamp:
+        noisy_avg = np.clip(noisy_avg, 0.0, b)
+    noisy_avg[n == 0] = 0.0
+    return noisy_avg, true_avg
+
+
+def dp_mean_from_sum(total, n, a, b, epsilon, clamp=False):
+    """
+    Scalar Laplace mean from a sum and a count, same mechanism as the
+    list-based dp_average in views.py. Returns (noisy_avg, true_avg).
+    """
+    if not n:
+        return 0.0, 0.0
+    true_avg = (total or 0) / n
+    noisy_avg = true_avg + float(np.random.laplace(0, (b - a) / n / epsilon))
+    if clamp:
+        noisy_avg = max(0.0, min(b, noisy_avg))
+    return noisy_avg, true_avg
+
+
+def noisy_counts(counts, epsilon, rng=None):
+    """Release noisy counts (sensitivity 1) for every group in one draw."""
+    counts = np.asarray(counts, dtype=np.float64)
+    return counts + laplace_noise(np.full(counts.shape, 1.0 / epsilon), rng=rng)
+
+
+def professor_release(stats, rng=None):
+    """
+    Noisy per-professor statistics as shown on the site, for a whole batch.
+
+    Same mechanisms and budgets as professor_profile: Laplace averages with
+    AVERAGE_EPSILON and a noisy would-take-again count with COUNT_EPSILON,
+    each drawn once for the batch. Returns a dict of arrays.
+    """
+    rng = rng or np.random.default_rng()
+    n = stats['n']
+    release = {'total_reviews': n}
+    for attr, key in (('rating', 'average_rating'), ('difficulty', 'average_difficulty'),
+                      ('helpful', 'average_help_useful')):
+        field, (a, b) = AVERAGE_FIELDS[attr]
+        noisy, _ = noisy_averages(stats[f'{attr}_sum'], n, a, b, AVERAGE_EPSILON, rng=rng)
+        release[key] = np.round(noisy, 1)
+    noisy_count = np.maximum(noisy_counts(stats['take_again'], COUNT_EPSILON, rng=rng), 0.0)
+    percent = np.divide(100.0 * noisy_count, n, out=np.zeros(n.shape), where=n > 0)
+    release['would_take_again_percent'] = np.clip(np.round(percent), 0, 100).astype(np.int64)
+    return release
+
+
+def iter_professor_releases(queryset, batch_size=500, rng=None):
+    """
+    Yield one dict per professor with school, department and noisy stats.
+
+    Rows are read from a server-side cursor and noised batch_size professors
+    at a time, so memory stays constant for any number of professors.
+    """
+    rng = rng or np.random.default_rng()
+    key = itemgetter('professor_name')
+    rows = combine_rows(sharding.iterate(professor_rows(queryset), key=key, chunk_size=batch_size), key)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield from release_rows(batch, rng)
+            batch = []
+    if batch:
+        yield from release_rows(batch, rng)
+
+
+def professor_rows(queryset):
+    """Per-professor stats_rows() with school and department, as release_rows() expects."""
+    return stats_rows(
+        queryset, ['professor_name'],
+        school=Min('school_name'), department=Min('department_name'),
+    )
+
+
+def release_rows(rows, rng=None):
+    """Yield display dicts for a batch of professor_rows() results."""
+    stats = rows_to_stats(rows, ['professor_name', 'school', 'department'])
+    release = professor_release(stats, rng)
+    for i, row in enumerate(rows):
+        yield {
+            'name': row['professor_name'],
+            'school_name': row['school'],
+            'department_name': row['department'],
+            'total_reviews': int(release['total_reviews'][i]),
+            'average_rating': float(release['average_rating'][i]),
+            'average_difficulty': float(release['average_difficulty'][i]),
+            'average_help_useful': float(release['average_help_useful'][i]),
+            'would_take_again_percent': int(release['would_take_again_percent'][i]),
+        }
+
+
+def consistent_two_level(parent, children, parent_index):
+    """
+    Make noisy child totals add up to their noisy parent total.
+
+    Assumes every node was released with the same noise variance. The parent
+    total is re-estimated as the inverse-variance weighted mix of the parent
+    release and the sum of its k children, (k * parent + sum) / (k + 1), and
+    the difference is spread evenly across the children (least squares).
+    Returns (parent, children) as new arrays.
+    """
+    parent = np.asarray(parent, dtype=np.float64)
+    children = np.asarray(children, dtype=np.float64)
+    k = np.bincount(parent_index, minlength=parent.size).astype(np.float64)
+    child_sum = np.bincount(parent_index, weights=children, minlength=parent.size)
+    total = np.where(k > 0, (k * parent + child_sum) / (k + 1.0), parent)
+    adjust = np.divide(total - child_sum, k, out=np.zeros_like(total), where=k > 0)
+    return total, children + adjust[parent_index]
+
+
+# Histogram attributes -> (model field, bucket values). Every row falls in
+# exactly one bucket per attribute (out-of-range values go to the end
+# buckets), so each histogram has L1 sensitivity 1.
+HISTOGRAM_BUCKETS = {
+    'rating': ('star_rating', [0, 1, 2, 3, 4, 5]),
+    'difficulty': ('difficulty', [1, 2, 3, 4, 5]),
+    'helpful': ('help_useful', [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]),
+}
+
+# Privacy loss per histogram. Every review is counted in all three, so one
+# release of the three costs 3 * HISTOGRAM_EPSILON. With DP_MEAN_FROM_HISTOGRAM
+# the displayed means are derived from them at no extra cost; by default the
+# separate mean releases (AVERAGE_EPSILON each) add up on top.
+HISTOGRAM_EPSILON = 1.0
+
+
+def _bucket_filter(field, values, i):
+    """Rows of bucket i: values rounded to the nearest bucket value."""
+    q = Q()
+    if i > 0:
+        q &= Q(**{f'{field}__gte': values[i] - 0.5})
+    if i < len(values) - 1:
+        q &= Q(**{f'{field}__lt': values[i] + 0.5})
+    return q
+
+
+def histogram_annotations():
+    """Conditional Count expressions for every bucket of every histogram."""
+    annotations = {}
+    for attr, (field, values) in HISTOGRAM_BUCKETS.items():
+        for i in range(len(values)):
+            annotations[f'{attr}_{i}'] = Count('id', filter=_bucket_filter(field, values, i))
+    return annotations
+
+
+def histogram_counts(queryset, group_by=None):
+    """
+    Bucket counts for all histograms in one query.
+
+    Without group_by returns {attr: counts} for the whole queryset. With
+    group_by returns (keys, {attr: counts}) where counts has one row per key.
+    """
+    annotations = histogram_annotations()
+    if group_by is None:
+        return histogram_row_counts(queryset.aggregate(**annotations))
+    key = itemgetter(group_by)
+    rows = list(combine_rows(
+        sharding.iterate(queryset.values(group_by).annotate(**annotations).order_by(group_by), key=key),
+        key, sums=annotations,
+    ))
+    keys = [r[group_by] for r in rows]
+    counts = {
+        attr: np.array(
+            [[r[f'{attr}_{i}'] for i in range(len(values))] for r in rows], dtype=np.float64
+        ).reshape(len(rows), len(values))
+        for attr, (field, values) in HISTOGRAM_BUCKETS.items()
+    }
+    return keys, counts
+
+
+def histogram_row_counts(row):
+    """{attr: counts} from one aggregate() row of histogram_annotations()."""
+    return {
+        attr: np.array([row[f'{attr}_{i}'] for i in range(len(values))], dtype=np.float64)
+        for attr, (field, values) in HISTOGRAM_BUCKETS.items()
+    }
+
+
+def noisy_histograms(counts, epsilon=HISTOGRAM_EPSILON, rng=None):
+    """
+    Add Laplace(1/epsilon) noise to every bucket of every histogram in one
+    draw. The counts are not clipped; the display clips them at zero.
+    """
+    attrs = list(counts)
+    widths = [counts[attr].shape[-1] for attr in attrs]
+    stacked = np.concatenate([counts[attr] for attr in attrs], axis=-1)
+    noisy = stacked + laplace_noise(np.full(stacked.shape, 1.0 / epsilon), rng=rng)
+    return dict(zip(attrs, np.split(noisy, np.cumsum(widths)[:-1], axis=-1)))
+
+
+def project_to_simplex(counts, total):
+    """
+    Euclidean projection of each row of counts (last axis) onto the
+    non-negative vectors summing to total.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    total = np.asarray(total, dtype=np.float64)[..., None]
+    ordered = -np.sort(-counts, axis=-1)
+    excess = np.cumsum(ordered, axis=-1) - total
+    k = np.arange(1, counts.shape[-1] + 1)
+    support = (ordered - excess / k > 0).sum(axis=-1, keepdims=True)
+    theta = np.take_along_axis(excess, support - 1, axis=-1) / support
+    return np.maximum(counts - theta, 0.0)
+
+
+def histogram_means(noisy):
+    """
+    Means derived from noisy histograms.
+
+    Clipping the counts at zero would move mass into the empty buckets and
+    pull small groups toward the middle of the scale, so the counts are
+    projected onto the simplex of their noisy total (at least 1) instead.
+    """
+    means = {}
+    for attr, counts in noisy.items():
+        values = np.array(HISTOGRAM_BUCKETS[attr][1], dtype=np.float64)
+        total = np.maximum(counts.sum(axis=-1), 1.0)
+        projected = project_to_simplex(counts, total)
+        means[attr] = (projected * values).sum(axis=-1) / total
+    return means
+
+
+def _histogram_release(noisy, means, index=None):
+    """Display form of one group's noisy histograms."""
+    release = {}
+    for attr, counts in noisy.items():
+        row = np.maximum(counts if index is None else counts[index], 0.0)
+        mean = means[attr] if index is None else means[attr][index]
+        total = row.sum()
+        release[attr] = {
+            'buckets': [
+                {
+                    'value': value,
+                    'count': int(round(count)),
+                    'percent': round(100.0 * count / total) if total > 0 else 0,
+                }
+                for value, count in zip(HISTOGRAM_BUCKETS[attr][1], row)
+            ],
+            'mean': float(mean),
+        }
+    return release
+
+
+def histogram_release(counts, epsilon=HISTOGRAM_EPSILON, rng=None):
+    """Display form of noisy histograms for one group's exact {attr: counts}."""
+    noisy = noisy_histograms(counts, epsilon, rng)
+    return _histogram_release(noisy, histogram_means(noisy))
+
+
+def dp_histogram(queryset, epsilon=HISTOGRAM_EPSILON, rng=None):
+    """
+    Noisy rating / difficulty / helpfulness histograms for one queryset,
+    from a single grouped query and a single noise draw.
+    """
+    return histogram_release(histogram_counts(queryset), epsilon, rng)
+
+
+async def adp_histogram(queryset, epsilon=HISTOGRAM_EPSILON, rng=None):
+    """Async version of dp_histogram for the async views."""
+    row = await queryset.aaggregate(**histogram_annotations())
+    return histogram_release(histogram_row_counts(row), epsilon, rng)
+
+
+def dp_histograms_bulk(queryset, group_by='professor_name', epsilon=HISTOGRAM_EPSILON, rng=None):
+    """Noisy histograms for every group of the queryset, keyed by group value."""
+    keys, counts = histogram_counts(queryset, group_by)
+    if not keys:
+        return {}
+    noisy = noisy_histograms(counts, epsilon, rng)
+    means = histogram_means(noisy)
+    return {key: _histogram_release(noisy, means, i) for i, key in enumerate(keys)}
@@ -0,0 +1,88 @@
+"""
+Constant-memory exports of DP aggregates and scrubbed comments.
+
+Both modes read from a server-side cursor (QuerySet.iterator) and yield
+records one at a time, so the same generators back the streaming HTTP
+endpoint and the export_data management command.
+
+- 'aggregates': one record per professor with noisy statistics, computed a
+  batch of professors at a time through the DP mechanisms.
+- 'comments': one record per review with the comment passed through the
+  regex scrubber. Raw ratings are not included.
+"""
+import csv
+import json
+
+from . import dp, sharding
+from .models import ITEM
+from .scrubber import detect_and_remove_personal_info
+
+MODES = ('aggregates', 'comments')
+FORMATS = ('ndjson', 'csv')
+
+AGGREGATE_FIELDS = [
+    'name', 'school_name', 'department_name', 'total_reviews', 'average_rating',
+    'average_difficulty', 'average_help_useful', 'would_take_again_percent',
+]
+COMMENT_FIELDS = ['id', 'professor_name', 'school_name', 'department_name', 'course', 'comments']
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def iter_aggregate_records(queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Noisy per-professor aggregates, noised chunk_size professors at a time."""
+    if queryset is None:
+        queryset = ITEM.objects.all()
+    return dp.iter_professor_releases(queryset, batch_size=chunk_size)
+
+
+def iter_comment_records(queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Reviews with regex-scrubbed comments, in id order."""
+    if queryset is None:
+        queryset = ITEM.objects.all()
+    rows = sharding.iterate(queryset.order_by('id').values_list(*COMMENT_FIELDS), chunk_size=chunk_size)
+    for row in rows:
+        record = dict(zip(COMMENT_FIELDS, row))
+        _, record['comments'] = detect_and_remove_personal_info(record['comments'])
+        yield record
+
+
+def iter_records(mode, queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    if mode == 'aggregates':
+        return iter_aggregate_records(queryset, chunk_size)
+    if mode == 'comments':
+        return iter_comment_records(queryset, chunk_size)
+    raise ValueError(f'Unknown export mode: {mode}')
+
+
+def fields_for(mode):
+    return AGGREGATE_FIELDS if mode == 'aggregates' else COMMENT_FIELDS
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def iter_ndjson(records):
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def iter_csv(records, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for record in records:
+        yield writer.writerow([record[field] for field in fields])
+
+
+def iter_lines(mode, fmt, queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Serialized export lines for the given mode and format."""
+    records = iter_records(mode, queryset, chunk_size)
+    if fmt == 'csv':
+        return iter_csv(records, fields_for(mode))
+    if fmt == 'ndjson':
+        return iter_ndjson(records)
+    raise ValueError(f'Unknown export format: {fmt}')
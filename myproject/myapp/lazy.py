@@ -0,0 +1,26 @@
+"""
+Deferred imports for heavy modules.
+
+lazy_import('numpy') returns a module object that is only executed on first
+attribute access, so importing views.py (which every manage.py command does
+through the URL checks) doesn't pay for NumPy or the DP code until a view
+actually needs them.
+"""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """Return the module `name`, loading it on first attribute access."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f'No module named {name!r}')
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,344 @@
+"""
+Gemini client access and the call layer around it.
+
+The client (and the google.genai import behind it) is created on first use
+instead of at import time, so management commands and worker boot don't
+pay for it. Its HTTP client keeps up to POOL_SIZE keep-alive connections,
+and warm_up() opens them in the background so the first requests after
+boot don't pay for the TLS handshakes.
+
+generate_content() wraps one client.models.generate_content() call:
+
+- Hedging: if the first request hasn't answered after the HEDGE_PERCENTILE
+  latency of recent requests, a duplicate is sent and whichever answers
+  first wins. A request that fails early with a transient error (5xx,
+  connection) is re-sent the same way; client errors, 429 and quota errors
+  are raised right away. Hedges and re-sends share a budget of HEDGE_BUDGET
+  per call on average, so a slow or failing upstream doesn't get twice the
+  load.
+- Deadline: the call raises LLMTimeout after DEADLINE_MS in total. The
+  losing or late request can't be cancelled; it finishes in the pool and
+  its latency is still recorded if it succeeds.
+- Histograms: latency of every successful upstream request (the hedge
+  delay is a percentile of these), and end-to-end latency per call name,
+  in log-spaced buckets (see stats()).
+
+For testing against a local fake server with injected latency, point
+GEMINI_CALLS['BASE_URL'] at the fake_gemini management command.
+"""
+import bisect
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+DEFAULTS = {
+    'MODEL': 'gemini-2.5-flash',
+    'BASE_URL': None,           # None: the public endpoint
+    'POOL_SIZE': 8,             # keep-alive HTTP connections (and call threads)
+    'WARM_UP': True,            # open the pool's connections after the client is built
+    'DEADLINE_MS': 15000,       # total time for one call, hedge included
+    'HEDGE_PERCENTILE': 0.95,   # hedge once the first request is slower than this
+    'HEDGE_DELAY_MS': 4000,     # hedge delay until MIN_SAMPLES requests were timed
+    'MIN_HEDGE_DELAY_MS': 50,
+    'MIN_SAMPLES': 20,
+    'HEDGE_BUDGET': 0.1,        # hedges per call, on average
+}
+
+# Histogram bucket upper bounds in ms: 1 ms to about 2 min, 25% apart
+BUCKETS_MS = tuple(round(1.25 ** i, 3) for i in range(53))
+# Halve all counts after this many samples so percentiles follow recent latency
+DECAY_EVERY = 1000
+
+_UNSET = object()
+_client = _UNSET
+_client_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class LLMTimeout(TimeoutError):
+    """No answer within the call's deadline."""
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, 'GEMINI_CALLS', {})}
+
+
+def is_transient(error):
+    """
+    Whether a failed request is worth re-sending: a server error (5xx) or a
+    connection problem. google-genai's APIError and httpx errors are checked
+    by their attributes, so neither has to be imported.
+    """
+    status = getattr(error, 'code', None)
+    if not isinstance(status, int):
+        status = getattr(error, 'status_code', None)
+    if not isinstance(status, int):
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # httpx.TransportError subclasses (ConnectError, ReadTimeout, ...)
+    return any(cls.__name__ == 'TransportError' for cls in type(error).__mro__)
+
+
+class LatencyHistogram:
+    """Log-bucketed latency counts with periodic decay."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0.0] * (len(BUCKETS_MS) + 1)    # last bucket: over the top bound
+        self.samples = 0
+        self.total = 0
+
+    def record(self, ms):
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+            self.samples += 1
+            self.total += 1
+            if self.samples >= DECAY_EVERY:
+                self.counts = [count / 2 for count in self.counts]
+                self.samples //= 2
+
+    def percentile(self, p):
+        """Upper bound (ms) of the bucket holding the p-quantile, or None if empty."""
+        with self._lock:
+            total = sum(self.counts)
+            if not total:
+                return None
+            seen = 0.0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= p * total:
+                    return BUCKETS_MS[min(i, len(BUCKETS_MS) - 1)]
+        return BUCKETS_MS[-1]
+
+    def stats(self):
+        with self._lock:
+            buckets = {
+                (str(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else 'inf'): round(count, 1)
+                for i, count in enumerate(self.counts) if count
+            }
+            total = self.total
+        return {
+            'count': total,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets_ms': buckets,
+        }
+
+
+class HedgedCaller:
+    """Runs calls with a latency-percentile hedge and a total deadline."""
+
+    def __init__(self, config):
+        self.config = config
+        self.requests = LatencyHistogram()
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._budget = 1.0
+        self.counters = {'calls': 0, 'hedged': 0, 'hedge_wins': 0, 'retried': 0, 'deadline_exceeded': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def hedge_delay(self):
+        """Seconds to wait for the first request before sending a duplicate."""
+        config = self.config
+        delay_ms = config['HEDGE_DELAY_MS']
+        if self.requests.total >= config['MIN_SAMPLES']:
+            delay_ms = self.requests.percentile(config['HEDGE_PERCENTILE'])
+        return max(config['MIN_HEDGE_DELAY_MS'], delay_ms) / 1000.0
+
+    def _take_hedge(self):
+        with self._lock:
+            if self._budget >= 1.0:
+                self._budget -= 1.0
+                return True
+            return False
+
+    def _timed(self, fn):
+        start = time.monotonic()
+        result = fn()
+        # Failures often return fast and would pull the hedge delay down
+        self.requests.record((time.monotonic() - start) * 1000.0)
+        return result
+
+    def call(self, fn, name='default', deadline_ms=None):
+        """Result of fn() from the first request that succeeds in time."""
+        start = time.monotonic()
+        deadline = start + (deadline_ms or self.config['DEADLINE_MS']) / 1000.0
+        with self._lock:
+            self.counters['calls'] += 1
+            self._budget = min(10.0, self._budget + self.config['HEDGE_BUDGET'])
+        try:
+            return self._call(fn, deadline)
+        except LLMTimeout:
+            self._count('deadline_exceeded')
+            raise
+        except Exception:
+            self._count('errors')
+            raise
+        finally:
+            with self._lock:
+                histogram = self.calls.setdefault(name, LatencyHistogram())
+            histogram.record((time.monotonic() - start) * 1000.0)
+
+    def _call(self, fn, deadline):
+        pool = _get_pool()
+        first = pool.submit(self._timed, fn)
+        pending = {first}
+        hedged = False
+        hedge = None
+        error = None
+        hedge_at = time.monotonic() + self.hedge_delay()
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                raise LLMTimeout('No Gemini answer before the deadline')
+            timeout = deadline - now if hedged else min(deadline, hedge_at) - now
+            done, pending = wait(pending, timeout=max(0.0, timeout), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+            if hedged:
+                continue
+            if done:
+                # The first request failed: re-send it right away if that can
+                # help and the budget allows, else give up
+                hedged = True
+                if is_transient(error) and self._take_hedge():
+                    self._count('retried')
+                    pending.add(pool.submit(self._timed, fn))
+            elif time.monotonic() >= hedge_at:
+                # At most one hedge; over budget, just keep waiting for the first request
+                hedged = True
+                if self._take_hedge():
+                    self._count('hedged')
+                    hedge = pool.submit(self._timed, fn)
+                    pending.add(hedge)
+        raise error
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            calls = dict(self.calls)
+        return {
+            **counters,
+            'hedge_delay_ms': round(self.hedge_delay() * 1000.0, 1),
+            'requests': self.requests.stats(),
+            'calls_by_name': {name: histogram.stats() for name, histogram in calls.items()},
+        }
+
+
+_caller = None
+
+
+def _get_caller():
+    global _caller
+    if _caller is None:
+        with _pool_lock:
+            if _caller is None:
+                _caller = HedgedCaller(_config())
+    return _caller
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Two threads per connection: a call and its hedge
+                _pool = ThreadPoolExecutor(max_workers=2 * _config()['POOL_SIZE'], thread_name_prefix='gemini')
+    return _pool
+
+
+def _http_options(config):
+    """HttpOptions for the pooled client, or None if this google-genai can't take them."""
+    try:
+        import httpx
+        from google.genai import types
+        options = {
+            'timeout': config['DEADLINE_MS'],
+            'client_args': {
+                'limits': httpx.Limits(
+                    max_connections=2 * config['POOL_SIZE'],
+                    max_keepalive_connections=config['POOL_SIZE'],
+                    keepalive_expiry=60.0,
+                ),
+            },
+        }
+        if config['BASE_URL']:
+            options['base_url'] = config['BASE_URL']
+        return types.HttpOptions(**options)
+    except Exception:
+        return None
+
+
+def _build_client():
+    api_key = getattr(settings, 'GEMINI_API_KEY', '')
+    if not api_key:
+        return None
+    try:
+        from google import genai
+    except Exception:
+        return None
+    http_options = _http_options(_config())
+    try:
+        if http_options is not None:
+            return genai.Client(api_key=api_key, http_options=http_options)
+        return genai.Client(api_key=api_key)
+    except Exception:
+        return None
+
+
+def get_gemini_client():
+    """Return the shared Gemini client, or None if it is unavailable."""
+    global _client
+    if _client is _UNSET:
+        with _client_lock:
+            if _client is _UNSET:
+                _client = _build_client()
+                if _client is not None and _config()['WARM_UP']:
+                    warm_up(_client)
+    return _client
+
+
+def warm_up(client):
+    """Open the pool's connections in the background with cheap model lookups."""
+    config = _config()
+
+    def lookup():
+        try:
+            client.models.get(model=config['MODEL'])
+        except Exception:
+            pass
+    pool = _get_pool()
+    for _ in range(config['POOL_SIZE']):
+        pool.submit(lookup)
+
+
+def generate_content(client, contents, name='default', model=None, deadline_ms=None):
+    """
+    client.models.generate_content() with hedging and a deadline. name
+    labels the call in the latency histograms; raises LLMTimeout when the
+    deadline passes, or the last request's error if every request failed.
+    """
+    model = model or _config()['MODEL']
+    return _get_caller().call(
+        lambda: client.models.generate_content(model=model, contents=contents),
+        name=name, deadline_ms=deadline_ms,
+    )
+
+
+def stats():
+    """Hedging counters and latency histograms of this worker process."""
+    return _get_caller().stats()
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import sharding
+from myapp.llm import get_gemini_client
+from myapp.models import ITEM
+from myapp.versioning import bump_data_version
+from myapp.views import make_reviews_private
+
+
+class Command(BaseCommand):
+    help = 'Run LLM anonymization over reviews queued by batch ingestion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20, help='Reviews per Gemini call')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many reviews')
+
+    def handle(self, *args, **options):
+        if get_gemini_client() is None:
+            raise CommandError('Gemini is not configured (GEMINI_API_KEY); queued reviews stay queued')
+        batch_size = max(1, options['batch_size'])
+        comments_length = ITEM._meta.get_field('comments').max_length
+        processed = 0
+        failing = False
+        for alias in sharding.shards():
+            if failing:
+                break
+            items = ITEM.objects.using(alias)
+            while options['limit'] is None or processed < options['limit']:
+                size = batch_size if options['limit'] is None else min(batch_size, options['limit'] - processed)
+                batch = list(items.filter(needs_anonymization=True).order_by('id')[:size])
+                if not batch:
+                    break
+                cleaned, checked = make_reviews_private([review.comments for review in batch])
+                # Reviews Gemini didn't see (the call failed) stay queued
+                done = []
+                for review, text, ok in zip(batch, cleaned, checked):
+                    if ok:
+                        review.comments = text[:comments_length]
+                        review.needs_anonymization = False
+                        done.append(review)
+                if not done:
+                    self.stderr.write(self.style.WARNING('Gemini calls are failing; stopping'))
+                    failing = True
+                    break
+                items.bulk_update(done, ['comments', 'needs_anonymization'])
+                processed += len(done)
+                self.stdout.write(f'Anonymized {processed} reviews')
+
+        if processed:
+            bump_data_version()
+        self.stdout.write(self.style.SUCCESS(f'Successfully anonymized {processed} reviews'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from myapp import continual
+from myapp.models import ITEM, TakeAgainCounter
+
+
+class Command(BaseCommand):
+    help = 'Create continual-release would-take-again counters from the existing reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Rebuild every counter (spends the budget again); default only fills missing ones')
+        parser.add_argument('--professor', action='append', default=[],
+                            help='Rebuild just this professor\'s counter (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Counters saved per bulk_create')
+
+    def handle(self, *args, **options):
+        if options['professor']:
+            continual.rebuild(options['professor'])
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(options['professor'])} counters"))
+            return
+
+        queryset = ITEM.objects.all()
+        with transaction.atomic():
+            if options['reset']:
+                TakeAgainCounter.objects.all().delete()
+            else:
+                # A list, not a subquery: the reviews may be on other databases
+                existing = list(TakeAgainCounter.objects.values_list('professor_name', flat=True))
+                queryset = queryset.exclude(professor_name__in=existing)
+
+            created = 0
+            batch = []
+            for counter in continual.build_counters(queryset):
+                batch.append(counter)
+                if len(batch) >= options['batch_size']:
+                    TakeAgainCounter.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            TakeAgainCounter.objects.bulk_create(batch)
+            created += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Created {created} counters'))
@@ -0,0 +1,215 @@
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import dp
+
+MECHANISMS = ('laplace', 'gaussian')
+STATISTICS = ('rating', 'difficulty', 'helpful', 'take_again')
+DEFAULT_EPSILONS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0]
+# Lower edges of the professor-size buckets (number of reviews)
+DEFAULT_BUCKETS = [1, 2, 5, 10, 25, 100]
+
+
+def _statistic_arrays(stats, statistic):
+    """Return (true_value, sensitivity) arrays for one statistic."""
+    n = stats['n'].astype(np.float64)
+    if statistic == 'take_again':
+        # Noise is added to the count, the site shows it as a percentage
+        true_value = 100.0 * stats['take_again'] / n
+        sensitivity = 100.0 / n
+    else:
+        field, (a, b) = dp.AVERAGE_FIELDS[statistic]
+        true_value = stats[f'{statistic}_sum'] / n
+        sensitivity = dp.average_sensitivity(n, a, b)
+    return true_value, sensitivity
+
+
+def _run_cell(task):
+    """
+    Evaluate one (statistic, epsilon, mechanism) cell of the grid.
+    Runs in a worker process, so it only touches plain NumPy data.
+    """
+    true_value = task['true_value']
+    sensitivity = task['sensitivity']
+    epsilon = task['epsilon']
+    mechanism = task['mechanism']
+    trials = task['trials']
+    batch = max(1, task['batch'])
+    rng = np.random.default_rng(task['seed'])
+
+    if mechanism == 'laplace':
+        scale = dp.laplace_scale(sensitivity, epsilon)
+        half_width = scale * np.log(1.0 / task['alpha'])
+    else:
+        scale = dp.gaussian_sigma(sensitivity, epsilon, task['delta'])
+        half_width = scale * NormalDist().inv_cdf(1.0 - task['alpha'] / 2.0)
+
+    abs_err = np.zeros_like(true_value)
+    sq_err = np.zeros_like(true_value)
+    covered = np.zeros_like(true_value)
+    samples = []
+    kept = 0
+    keep = task['keep_samples']
+
+    done = 0
+    while done < trials:
+        k = min(batch, trials - done)
+        if mechanism == 'laplace':
+            noise = rng.laplace(0.0, 1.0, size=(k, true_value.size)) * scale
+        else:
+            noise = rng.standard_normal(size=(k, true_value.size)) * scale
+        noisy = true_value + noise
+        if task['clamp']:
+            noisy = np.clip(noisy, task['low'], task['high'])
+        err = noisy - true_value
+        abs_err += np.abs(err).sum(axis=0)
+        sq_err += (err * err).sum(axis=0)
+        covered += (np.abs(noisy - true_value) <= half_width).sum(axis=0)
+        if kept < keep:
+            samples.append(noisy[:keep - kept].astype(np.float32))
+            kept += samples[-1].shape[0]
+        done += k
+
+    return {
+        'key': task['key'],
+        'mae': abs_err / trials,
+        'rmse': np.sqrt(sq_err / trials),
+        'coverage': covered / trials,
+        'samples': np.concatenate(samples, axis=0) if samples else np.empty((0, true_value.size), np.float32),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Evaluate DP utility (MAE, RMSE, coverage) over a grid of epsilons and mechanisms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--epsilons', nargs='+', type=float, default=DEFAULT_EPSILONS)
+        parser.add_argument('--mechanisms', nargs='+', choices=MECHANISMS, default=list(MECHANISMS))
+        parser.add_argument('--statistics', nargs='+', choices=STATISTICS, default=list(STATISTICS))
+        parser.add_argument('--trials', type=int, default=1000, help='Noise draws per professor and grid cell')
+        parser.add_argument('--batch-size', type=int, default=256, help='Trials drawn per vectorized batch')
+        parser.add_argument('--delta', type=float, default=1e-5, help='Delta for the Gaussian mechanism')
+        parser.add_argument('--alpha', type=float, default=0.05, help='Miss rate of the nominal coverage interval')
+        parser.add_argument('--buckets', nargs='+', type=int, default=DEFAULT_BUCKETS,
+                            help='Lower edges of the professor-size buckets')
+        parser.add_argument('--clamp', action='store_true', help='Clamp noisy values to the attribute bounds')
+        parser.add_argument('--keep-samples', type=int, default=200,
+                            help='Noisy draws per professor to keep for distribution plots')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--output', default='dp_eval', help='Output path prefix for the .npz and .csv files')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = dp.professor_stats()
+        if stats['n'].size == 0:
+            raise CommandError('No reviews in the database')
+        self.stdout.write(f"Loaded statistics for {stats['n'].size} professors")
+
+        edges = sorted(set(options['buckets']))
+        bucket_of = np.searchsorted(edges, stats['n'], side='right') - 1
+        bucket_labels = [
+            f'{lo}-{edges[i + 1] - 1}' if i + 1 < len(edges) else f'{lo}+'
+            for i, lo in enumerate(edges)
+        ]
+
+        seeds = np.random.SeedSequence(options['seed'])
+        grid = [
+            (statistic, epsilon, mechanism)
+            for statistic in options['statistics']
+            for epsilon in options['epsilons']
+            for mechanism in options['mechanisms']
+        ]
+        tasks = []
+        for key, child in zip(grid, seeds.spawn(len(grid))):
+            statistic, epsilon, mechanism = key
+            true_value, sensitivity = _statistic_arrays(stats, statistic)
+            if statistic == 'take_again':
+                low, high = 0.0, 100.0
+            else:
+                low, high = dp.AVERAGE_FIELDS[statistic][1]
+            tasks.append({
+                'key': key,
+                'true_value': true_value,
+                'sensitivity': sensitivity,
+                'epsilon': epsilon,
+                'mechanism': mechanism,
+                'trials': options['trials'],
+                'batch': options['batch_size'],
+                'delta': options['delta'],
+                'alpha': options['alpha'],
+                'clamp': options['clamp'],
+                'low': low,
+                'high': high,
+                'keep_samples': options['keep_samples'],
+                'seed': child,
+            })
+
+        if options['workers'] > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+                results = list(pool.map(_run_cell, tasks))
+        else:
+            results = [_run_cell(task) for task in tasks]
+
+        # Shape: (statistic, epsilon, mechanism, professor)
+        shape = (len(options['statistics']), len(options['epsilons']), len(options['mechanisms']))
+        per_prof = {m: np.zeros(shape + (stats['n'].size,)) for m in ('mae', 'rmse', 'coverage')}
+        samples = {}
+        rows = []
+        for result in results:
+            statistic, epsilon, mechanism = result['key']
+            idx = (
+                options['statistics'].index(statistic),
+                options['epsilons'].index(epsilon),
+                options['mechanisms'].index(mechanism),
+            )
+            for metric in per_prof:
+                per_prof[metric][idx] = result[metric]
+            samples[f'samples_{statistic}_{epsilon}_{mechanism}'] = result['samples']
+
+            for b, label in enumerate(bucket_labels):
+                mask = bucket_of == b
+                if not mask.any():
+                    continue
+                rows.append({
+                    'statistic': statistic,
+                    'epsilon': epsilon,
+                    'mechanism': mechanism,
+                    'bucket': label,
+                    'professors': int(mask.sum()),
+                    'mae': float(result['mae'][mask].mean()),
+                    'rmse': float(np.sqrt((result['rmse'][mask] ** 2).mean())),
+                    'coverage': float(result['coverage'][mask].mean()),
+                })
+
+        output = options['output']
+        np.savez_compressed(
+            f'{output}.npz',
+            statistics=np.array(options['statistics']),
+            epsilons=np.array(options['epsilons']),
+            mechanisms=np.array(options['mechanisms']),
+            professor_names=stats['names'].astype(str),
+            professor_sizes=stats['n'],
+            bucket_edges=np.array(edges),
+            **per_prof,
+            **samples,
+        )
+        with open(f'{output}.csv', 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ['statistic'])
+            writer.writeheader()
+            writer.writerows(rows)
+
+        draws = options['trials'] * stats['n'].size * len(tasks)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Evaluated {len(tasks)} grid cells ({draws:,} noise draws) in {elapsed:.1f}s; '
+                f'wrote {output}.npz and {output}.csv'
+            )
+        )
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from myapp import export
+from myapp.models import ITEM
+
+
+class Command(BaseCommand):
+    help = 'Export DP-protected professor aggregates or scrubbed comments as NDJSON/CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('mode', choices=export.MODES)
+        parser.add_argument('--format', choices=export.FORMATS, default='ndjson')
+        parser.add_argument('--school', default='', help='Only export reviews from this school')
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--output', '-o', default='-', help='Output file (default: stdout)')
+
+    def handle(self, *args, **options):
+        queryset = ITEM.objects.all()
+        if options['school']:
+            queryset = queryset.filter(school_name=options['school'])
+
+        lines = export.iter_lines(options['mode'], options['format'], queryset, options['chunk_size'])
+        out = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        count = 0
+        try:
+            for line in lines:
+                out.write(line)
+                count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        if options['output'] != '-':
+            self.stderr.write(self.style.SUCCESS(f"Wrote {count} lines to {options['output']}"))
@@ -0,0 +1,96 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+GENERATE_PATH = re.compile(r'^/[^/]+/models/([^/:]+):generateContent$')
+MODEL_PATH = re.compile(r'^/[^/]+/models/([^/:]+)$')
+
+DEFAULT_TEXT = '{"risk_level": "low", "rephrased_text": "fake answer"}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a fake Gemini generateContent endpoint with injected latency, '
+        "for testing the call layer (set GEMINI_CALLS['BASE_URL'] to its address)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=float, default=300.0, help='Median answer latency')
+        parser.add_argument('--jitter', type=float, default=0.3,
+                            help='Spread of the (lognormal) latency around the median')
+        parser.add_argument('--tail-rate', type=float, default=0.05, help='Fraction of answers that are slow')
+        parser.add_argument('--tail-ms', type=float, default=5000.0, help='Latency of the slow answers')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of answers that are HTTP 500')
+        parser.add_argument('--text', default=DEFAULT_TEXT, help='Text of every answer')
+
+    def handle(self, *args, **options):
+        stats = {'requests': 0, 'slow': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def delay():
+            if random.random() < options['tail_rate']:
+                with lock:
+                    stats['slow'] += 1
+                return options['tail_ms'] / 1000.0
+            return options['latency_ms'] * random.lognormvariate(0.0, options['jitter']) / 1000.0
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'   # keep-alive, like the real endpoint
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                match = MODEL_PATH.match(self.path.split('?')[0])
+                if match is None:
+                    return self._send(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+                self._send(200, {'name': f'models/{match.group(1)}', 'displayName': match.group(1)})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                match = GENERATE_PATH.match(self.path.split('?')[0])
+                if match is None:
+                    return self._send(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+                with lock:
+                    stats['requests'] += 1
+                time.sleep(delay())
+                if random.random() < options['error_rate']:
+                    with lock:
+                        stats['errors'] += 1
+                    return self._send(500, {'error': {'code': 500, 'message': 'Injected error', 'status': 'INTERNAL'}})
+                self._send(200, {
+                    'candidates': [{
+                        'content': {'role': 'model', 'parts': [{'text': options['text']}]},
+                        'finishReason': 'STOP',
+                        'index': 0,
+                    }],
+                    'modelVersion': match.group(1),
+                })
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        server.daemon_threads = True
+        self.stdout.write(f"Fake Gemini on http://{options['host']}:{options['port']} (Ctrl-C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(
+                f"{stats['requests']} requests, {stats['slow']} slow, {stats['errors']} errors"
+            )
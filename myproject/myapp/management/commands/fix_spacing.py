@@ -1,13 +1,16 @@
 from django.core.management.base import BaseCommand
+from myapp import continual, sharding
 from myapp.models import ITEM
+from myapp.versioning import bump_data_version
 
 class Command(BaseCommand):
     help = 'Fix spacing issues in professor names'
 
     def handle(self, *args, **options):
         # Get all items
-        items = ITEM.objects.all()
+        items = list(sharding.iterate(ITEM.objects.all()))
         fixed_count = 0
+        renamed = set()
         
         for item in items:
             # Clean up the professor name
@@ -18,8 +21,15 @@ class Command(BaseCommand):
                 item.professor_name = cleaned_name
                 item.save()
                 fixed_count += 1
+                renamed.update((original_name, cleaned_name))
                 self.stdout.write(f"Fixed: '{original_name}' -> '{cleaned_name}'")
-        
+
+        if fixed_count:
+            # Counters are keyed by name: rebuild both the old and new ones
+            continual.rebuild(sorted(renamed))
+            # Existing rows changed in place: snapshots have to be rebuilt
+            bump_data_version(rewrite=True)
+
         self.stdout.write(
             self.style.SUCCESS(f'Successfully fixed {fixed_count} professor names')
         )
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from myapp import sharding
+from myapp.models import ITEM
+
+
+class Command(BaseCommand):
+    help = 'Physically delete tombstoned (is_deleted) reviews, a chunk per short transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Reviews deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to wait between chunks, so other writers get the lock')
+
+    def handle(self, *args, **options):
+        chunk_size = max(1, options['chunk_size'])
+        purged = 0
+        for alias in sharding.shards():
+            tombstones = ITEM.all_objects.using(alias).filter(is_deleted=True)
+            while True:
+                # Tombstones are never cleared, so the rows can be picked
+                # outside the transaction; it only holds the DELETE
+                ids = list(tombstones.order_by('id').values_list('id', flat=True)[:chunk_size])
+                if not ids:
+                    break
+                with transaction.atomic(using=alias):
+                    deleted, _ = tombstones.filter(id__in=ids).delete()
+                purged += deleted
+                self.stdout.write(f'{alias or "default"}: purged {purged} reviews')
+                if len(ids) < chunk_size:
+                    break
+                time.sleep(options['pause'])
+        # Tombstoned rows were already invisible to reads, so the data version
+        # stays the same
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} tombstoned reviews'))
@@ -0,0 +1,68 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from myapp import sharding
+from myapp.models import ITEM
+from myapp.versioning import bump_data_version
+
+
+class Command(BaseCommand):
+    help = 'Create the review shards (REVIEW_SHARDS) and optionally move reviews out of the default database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--move', action='store_true',
+                            help='Move reviews from the default database to their school shard (new ids)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Reviews moved per transaction')
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError('No shards configured; set REVIEW_SHARDS=<n> in the environment')
+
+        for index, alias in enumerate(sharding.shards()):
+            call_command('migrate', database=alias, verbosity=0)
+            self._seed_ids(alias, (index + 1) * sharding.SHARD_ID_SPAN)
+            self.stdout.write(f'{alias}: migrated, ids from {(index + 1) * sharding.SHARD_ID_SPAN + 1}')
+
+        if options['move']:
+            moved = self._move(max(1, options['batch_size']))
+            if moved:
+                # Reviews got new ids on their shards
+                bump_data_version(rewrite=True)
+            self.stdout.write(self.style.SUCCESS(f'Moved {moved} reviews to the shards'))
+
+    def _seed_ids(self, alias, start):
+        """Make the shard's ITEM ids start above `start` (SQLite AUTOINCREMENT)."""
+        connection = connections[alias]
+        if connection.vendor != 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                f'{alias}: not SQLite; set the ITEM id sequence to start at {start + 1} yourself'
+            ))
+            return
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [ITEM._meta.db_table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [ITEM._meta.db_table, start])
+            elif row[0] < start:
+                cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [start, ITEM._meta.db_table])
+
+    def _move(self, batch_size):
+        fields = [f.name for f in ITEM._meta.concrete_fields if not f.primary_key]
+        moved = 0
+        while True:
+            # Tombstoned reviews move too, and are purged from the shard later
+            batch = list(ITEM.all_objects.using('default').order_by('id')[:batch_size])
+            if not batch:
+                return moved
+            by_shard = {}
+            for review in batch:
+                copy = ITEM(**{name: getattr(review, name) for name in fields})
+                by_shard.setdefault(sharding.shard_for_school(review.school_name), []).append(copy)
+            with transaction.atomic(using='default'):
+                for alias, reviews in by_shard.items():
+                    with transaction.atomic(using=alias):
+                        ITEM.all_objects.using(alias).bulk_create(reviews)
+                ITEM.all_objects.using('default').filter(id__in=[review.id for review in batch]).delete()
+            moved += len(batch)
+            self.stdout.write(f'Moved {moved} reviews')
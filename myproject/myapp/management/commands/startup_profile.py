@@ -0,0 +1,82 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so nothing is already imported. Prints one JSON
+# line with wall-clock phase timings; -X importtime writes per-module times
+# to stderr.
+CHILD_SCRIPT = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings_module!r})
+django.setup()
+t1 = time.perf_counter()
+import importlib
+phases = {{'django.setup': t1 - t0}}
+for name in {targets!r}:
+    start = time.perf_counter()
+    importlib.import_module(name)
+    phases['import ' + name] = time.perf_counter() - start
+# Modules registered by lazy_import() but never executed don't count
+loaded = [m for m in {watch!r} if m in sys.modules and type(sys.modules[m]).__name__ != '_LazyModule']
+print(json.dumps({{'phases': phases, 'loaded': sorted(loaded)}}))
+"""
+
+# Heavy modules that should only load when a request needs them
+WATCHED_MODULES = ['numpy', 'google.genai', 'myapp.dp', 'myapp.aggregates', 'myapp.columnar']
+
+
+class Command(BaseCommand):
+    help = 'Report interpreter import time per module for Django setup and the URLconf'
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*',
+                            help='Modules to import after django.setup() (default: the ROOT_URLCONF)')
+        parser.add_argument('--top', type=int, default=25, help='Number of modules to list')
+        parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative')
+
+    def handle(self, *args, **options):
+        targets = options['modules'] or [settings.ROOT_URLCONF]
+        script = CHILD_SCRIPT.format(
+            settings_module=os.environ.get('DJANGO_SETTINGS_MODULE', 'myproject.settings'),
+            targets=targets,
+            watch=WATCHED_MODULES,
+        )
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            capture_output=True, text=True, cwd=str(settings.BASE_DIR),
+        )
+        if proc.returncode != 0:
+            raise CommandError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'Profiling failed')
+
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        modules = []
+        for line in proc.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package"
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules.append((int(self_us), int(cumulative_us), name.rstrip()))
+
+        self.stdout.write('Phases (wall clock):')
+        for phase, seconds in result['phases'].items():
+            self.stdout.write(f'  {phase:<40} {seconds * 1000:9.1f} ms')
+        self.stdout.write(f'Modules imported: {len(modules)}')
+
+        key = 0 if options['sort'] == 'self' else 1
+        self.stdout.write(f"\nTop {options['top']} modules by {options['sort']} import time:")
+        self.stdout.write(f"  {'self ms':>9} {'cumul ms':>9}  module")
+        for self_us, cumulative_us, name in sorted(modules, key=lambda m: m[key], reverse=True)[:options['top']]:
+            self.stdout.write(f'  {self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name}')
+
+        if result['loaded']:
+            self.stdout.write(self.style.WARNING(
+                f"\nHeavy modules loaded at startup: {', '.join(result['loaded'])}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('\nNo heavy modules loaded at startup'))
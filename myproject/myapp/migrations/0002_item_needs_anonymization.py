@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='needs_anonymization',
+            field=models.BooleanField(default=False, verbose_name='needs_anonymization'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0002_item_needs_anonymization'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['professor_name', 'id'], name='item_professor_id_idx'),
+        ),
+    ]
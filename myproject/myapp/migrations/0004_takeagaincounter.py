@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_item_professor_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TakeAgainCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('professor_name', models.CharField(max_length=150, unique=True, verbose_name='professor_name')),
+                ('steps', models.IntegerField(default=0, verbose_name='steps')),
+                ('alpha', models.JSONField(default=list, verbose_name='alpha')),
+                ('noisy_alpha', models.JSONField(default=list, verbose_name='noisy_alpha')),
+                ('base', models.FloatField(default=0.0, verbose_name='base')),
+            ],
+            options={
+                'db_table': 'TAKE_AGAIN_COUNTER',
+            },
+        ),
+    ]
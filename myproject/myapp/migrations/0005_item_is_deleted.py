@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_takeagaincounter'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_professor_id_idx',
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='is_deleted',
+            field=models.BooleanField(default=False, verbose_name='is_deleted'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['professor_name', 'id'], name='item_professor_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['id'], name='item_tombstone_idx'),
+        ),
+    ]
@@ -1,6 +1,13 @@
 from django.db import models
 from django.utils.translation import gettext as _
 # Create your models here.
+class LiveReviewManager(models.Manager):
+    """Reviews without a tombstone; the default manager, so every read skips deleted reviews."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 class ITEM(models.Model):
     professor_name = models.CharField(_("professor_name"),max_length=150)
     school_name = models.CharField(_("school_name"),max_length=150)
@@ -11,9 +18,39 @@ class ITEM(models.Model):
     would_take_agains = models.BooleanField(_("would_take_agains"),default=False)
     help_useful = models.IntegerField(_("help_useful"))
     comments = models.CharField(_("comments"),max_length=255)
+    # Set by batch ingestion: the comment was only regex-scrubbed and still
+    # needs LLM anonymization (see the anonymize_reviews command)
+    needs_anonymization = models.BooleanField(_("needs_anonymization"), default=False)
+    # Tombstone: set by deletes and bulk moderation, the row itself is removed
+    # later by the purge_tombstones command
+    is_deleted = models.BooleanField(_("is_deleted"), default=False)
+
+    objects = LiveReviewManager()
+    all_objects = models.Manager()
 
     class Meta:
         db_table = "ITEM"
+        indexes = [
+            # Keyset pagination of a professor's reviews (professor_reviews_api).
+            # Partial on the default manager's filter, so reads that skip
+            # tombstones still get id order from the index
+            models.Index(fields=['professor_name', 'id'], condition=models.Q(is_deleted=False),
+                         name='item_professor_live_idx'),
+            # The tombstones to purge (purge_tombstones)
+            models.Index(fields=['id'], condition=models.Q(is_deleted=True), name='item_tombstone_idx'),
+        ]
+
 
+class TakeAgainCounter(models.Model):
+    """Continual-release counter of would-take-again answers for one professor (see continual.py)."""
+    professor_name = models.CharField(_("professor_name"), max_length=150, unique=True)
+    # Events (reviews added or deleted) recorded in the current tree
+    steps = models.IntegerField(_("steps"), default=0)
+    # Exact and noisy partial sums, one per tree level
+    alpha = models.JSONField(_("alpha"), default=list)
+    noisy_alpha = models.JSONField(_("noisy_alpha"), default=list)
+    # Noisy total carried over from earlier, full trees
+    base = models.FloatField(_("base"), default=0.0)
 
-   
+    class Meta:
+        db_table = "TAKE_AGAIN_COUNTER"
@@ -0,0 +1,158 @@
+"""
+Per-worker cache of the distinct name lists shown by the browse pages.
+
+The sorted school, professor and course lists almost never change, but
+every page view used to re-run a DISTINCT ... ORDER BY over ITEM for them.
+They are kept here as tuples of strings, tagged with the data version they
+were loaded under. Every read compares that tag with the shared data-version
+stamp (see versioning.py), so a write or delete in any worker process drops
+the lists in all of them.
+
+- schools(), professors(): the two global lists, always kept
+- professors_at(school), courses_of(professor): one entry per key, evicted
+  least recently used first once the cache holds more than MAX_BYTES
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import sharding
+from .models import ITEM
+from .versioning import get_data_version
+
+DEFAULTS = {
+    'MAX_BYTES': 8 * 1024 * 1024,   # approximate size of all cached lists
+}
+
+
+def _size(values):
+    """Approximate memory held by a tuple of strings."""
+    return sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values)
+
+
+class NameListCache:
+    """Version-tagged sorted name lists with LRU eviction of the keyed ones."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._version = None
+        self._global = {}
+        self._keyed = OrderedDict()     # (kind, key) -> (values, size), oldest first
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _reset(self, version):
+        self._version = version
+        self._global = {}
+        self._keyed = OrderedDict()
+        self._bytes = 0
+
+    def get(self, kind, key, loader):
+        """Cached tuple for (kind, key), loading it with loader() on a miss."""
+        version = get_data_version()
+        with self._lock:
+            if version != self._version:
+                self._reset(version)
+            if key is None:
+                values = self._global.get(kind)
+            else:
+                entry = self._keyed.get((kind, key))
+                values = None
+                if entry is not None:
+                    self._keyed.move_to_end((kind, key))
+                    values = entry[0]
+            if values is not None:
+                self.hits += 1
+                return values
+            self.misses += 1
+
+        values = tuple(loader())
+        size = _size(values)
+        with self._lock:
+            # A write during the load bumped the version: serve, don't keep
+            if self._version != version:
+                return values
+            if key is None:
+                if kind not in self._global:
+                    self._global[kind] = values
+                    self._bytes += size
+            elif (kind, key) not in self._keyed and size <= self.max_bytes:
+                self._keyed[(kind, key)] = (values, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes and self._keyed:
+                    _, (_, evicted) = self._keyed.popitem(last=False)
+                    self._bytes -= evicted
+                    self.evictions += 1
+        return values
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self._version,
+                'entries': len(self._global) + len(self._keyed),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = {**DEFAULTS, **getattr(settings, 'NAME_LIST_CACHE', {})}
+                _cache = NameListCache(config['MAX_BYTES'])
+    return _cache
+
+
+def _distinct_on(alias, field, **filters):
+    return (
+        ITEM.objects.using(alias).filter(**filters)
+        .values_list(field, flat=True)
+        .distinct()
+        .order_by(field)
+    )
+
+
+def schools():
+    """All school names, sorted."""
+    return _get_cache().get('schools', None, lambda: sharding.distinct_values('school_name'))
+
+
+def professors():
+    """All professor names, sorted."""
+    return _get_cache().get('professors', None, lambda: sharding.distinct_values('professor_name'))
+
+
+def professors_at(school_name):
+    """Professor names with reviews at one school, sorted."""
+    return _get_cache().get(
+        'professors_at', school_name,
+        lambda: _distinct_on(sharding.shard_for_school(school_name), 'professor_name', school_name=school_name),
+    )
+
+
+def courses_of(professor_name):
+    """Course names reviewed for one professor, sorted."""
+    return _get_cache().get(
+        'courses_of', professor_name,
+        lambda: sharding.distinct_values('course', professor_name=professor_name),
+    )
+
+
+def stats():
+    return _get_cache().stats()
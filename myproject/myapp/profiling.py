@@ -0,0 +1,297 @@
+"""
+Opt-in per-request profiler.
+
+A staff user adds ?_profile=1 (or the X-Profile header) to any URL; the
+request then runs under a profiler and the result is written to the profile
+directory together with the SQL the ORM ran and its timings. The response
+carries an X-Profile-Id header naming the stored profile, and
+/internal/profiles/ lists the recent ones.
+
+Two modes (?_profile=cprofile / ?_profile=sampling, default from settings):
+
+- sampling: a background thread records the stacks of all threads every
+  INTERVAL seconds and writes speedscope JSON. This also covers async views,
+  whose code and ORM calls run in several threads. Other requests served by
+  the same process at the same time show up as well.
+- cprofile: deterministic cProfile of the thread that runs the request,
+  written as .pstats. For async views that is the event loop thread only.
+
+Only the time until the view returns its response is covered; the body of
+a streaming response is produced afterwards. Requests without the flag pay
+one dictionary lookup.
+"""
+import contextvars
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+DEFAULTS = {
+    'ENABLED': True,
+    'DIR': None,                # defaults to BASE_DIR / 'profiles'
+    'PARAM': '_profile',        # query flag
+    'HEADER': 'X-Profile',      # request header
+    'MODE': 'sampling',         # 'sampling' or 'cprofile'
+    'INTERVAL': 0.001,          # seconds between samples
+    'KEEP': 50,                 # profiles kept on disk
+    'MAX_QUERIES': 1000,        # SQL statements recorded per profile
+}
+MODES = ('sampling', 'cprofile')
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, 'REQUEST_PROFILER', {})}
+    if config['DIR'] is None:
+        config['DIR'] = settings.BASE_DIR / 'profiles'
+    return config
+
+
+# SQL capture: every connection gets a wrapper that only records while a
+# profiled request has set _captured_sql. The context variable follows the
+# request into sync_to_async threads, so async views are covered too.
+_captured_sql = contextvars.ContextVar('myapp_profiled_sql', default=None)
+
+
+def _record_sql(execute, sql, params, many, context):
+    queries = _captured_sql.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.append((sql, time.perf_counter() - start, many))
+
+
+def _install_sql_wrapper(connection, **kwargs):
+    if _record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_sql)
+
+
+connection_created.connect(_install_sql_wrapper)
+
+
+class StackSampler(threading.Thread):
+    """Records the stack of every other thread at a fixed interval."""
+
+    def __init__(self, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.interval = interval
+        self.samples = []       # (thread_id, stack, weight in seconds)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.append((thread_id, tuple(stack), weight))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def speedscope(self, name, duration):
+        """The samples as a speedscope file, one profile per thread."""
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        frames, frame_index, profiles = [], {}, {}
+        for thread_id, stack, weight in self.samples:
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+                indices.append(frame_index[frame])
+            profile = profiles.setdefault(thread_id, {
+                'type': 'sampled',
+                'name': thread_names.get(thread_id, str(thread_id)),
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': duration,
+                'samples': [],
+                'weights': [],
+            })
+            profile['samples'].append(indices)
+            profile['weights'].append(weight)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'myapp.profiling',
+            'shared': {'frames': frames},
+            'profiles': list(profiles.values()),
+        }
+
+
+class ProfileSession:
+    """Profiles one request and writes the result to the profile directory."""
+
+    def __init__(self, request, mode, config):
+        self.request = request
+        self.mode = mode
+        self.config = config
+        # Sortable by creation time, unique across processes
+        now = time.time()
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now % 1 * 1e6):06d}-{uuid.uuid4().hex[:6]}"
+        self.queries = []
+        self.profiler = None
+
+    def __enter__(self):
+        for connection in connections.all(initialized_only=True):
+            _install_sql_wrapper(connection)
+        self._token = _captured_sql.set(self.queries)
+        if self.mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = StackSampler(self.config['INTERVAL'])
+            self.profiler.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration = time.perf_counter() - self.start
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+        _captured_sql.reset(self._token)
+
+    def save(self, response):
+        directory = str(self.config['DIR'])
+        os.makedirs(directory, exist_ok=True)
+        match = getattr(self.request, 'resolver_match', None)
+        if self.mode == 'cprofile':
+            profile_file = f'{self.id}.pstats'
+            self.profiler.dump_stats(os.path.join(directory, profile_file))
+        else:
+            profile_file = f'{self.id}.speedscope.json'
+            with open(os.path.join(directory, profile_file), 'w') as f:
+                json.dump(self.profiler.speedscope(self.request.get_full_path(), self.duration), f)
+
+        recorded = self.queries[:self.config['MAX_QUERIES']]
+        metadata = {
+            'id': self.id,
+            'created': time.time(),
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'mode': self.mode,
+            'duration_ms': round(self.duration * 1000, 3),
+            'sql_count': len(self.queries),
+            'sql_ms': round(sum(q[1] for q in self.queries) * 1000, 3),
+            'sql': [
+                {'sql': sql, 'ms': round(seconds * 1000, 3), 'many': many}
+                for sql, seconds, many in recorded
+            ],
+            'profile_file': profile_file,
+        }
+        with open(os.path.join(directory, f'{self.id}.json'), 'w') as f:
+            json.dump(metadata, f)
+        _prune(directory, self.config['KEEP'])
+        response['X-Profile-Id'] = self.id
+
+
+def _prune(directory, keep):
+    """Delete all but the newest `keep` profiles."""
+    ids = sorted(name[:-len('.json')] for name in os.listdir(directory)
+                 if name.endswith('.json') and not name.endswith('.speedscope.json'))
+    for old in ids[:-keep] if keep else ids:
+        for suffix in ('.json', '.pstats', '.speedscope.json'):
+            path = os.path.join(directory, old + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def recent_profiles(limit=50):
+    """Metadata of the newest stored profiles, newest first (without the SQL list)."""
+    directory = str(get_config()['DIR'])
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((name for name in os.listdir(directory)
+                    if name.endswith('.json') and not name.endswith('.speedscope.json')),
+                   reverse=True)[:limit]
+    profiles = []
+    for name in names:
+        with open(os.path.join(directory, name)) as f:
+            metadata = json.load(f)
+        metadata.pop('sql', None)
+        profiles.append(metadata)
+    return profiles
+
+
+def profile_path(profile_id, kind):
+    """Path of a stored file: kind is 'meta' or 'profile'. None if missing."""
+    directory = str(get_config()['DIR'])
+    meta_path = os.path.join(directory, f'{os.path.basename(profile_id)}.json')
+    if not os.path.exists(meta_path):
+        return None
+    if kind == 'meta':
+        return meta_path
+    with open(meta_path) as f:
+        path = os.path.join(directory, json.load(f)['profile_file'])
+    return path if os.path.exists(path) else None
+
+
+class RequestProfilerMiddleware:
+    """Profiles staff requests carrying the profile query flag or header."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        self.meta_header = 'HTTP_' + self.config['HEADER'].upper().replace('-', '_')
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _requested_mode(self, request):
+        """The requested profiler mode, or None when the request isn't flagged."""
+        if not self.config['ENABLED']:
+            return None
+        value = request.GET.get(self.config['PARAM']) or request.META.get(self.meta_header)
+        if not value:
+            return None
+        return value if value in MODES else self.config['MODE']
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        mode = self._requested_mode(request)
+        if mode is None or not request.user.is_staff:
+            return self.get_response(request)
+        session = ProfileSession(request, mode, self.config)
+        with session:
+            response = self.get_response(request)
+        session.save(response)
+        return response
+
+    async def __acall__(self, request):
+        mode = self._requested_mode(request)
+        if mode is None or not (await request.auser()).is_staff:
+            return await self.get_response(request)
+        session = ProfileSession(request, mode, self.config)
+        with session:
+            response = await self.get_response(request)
+        session.save(response)
+        return response
@@ -0,0 +1,36 @@
+"""
+Read/write split for the production database profile.
+
+Reads of this app's models go to the 'replica' alias, a read-only
+connection to the same WAL-mode SQLite file: readers never wait for the
+writer and always see the last committed data. Writes, and reads made
+inside a transaction on 'default' (which must see their own uncommitted
+changes), stay on 'default'.
+"""
+from django.db import connections
+
+REPLICA = 'replica'
+
+
+class ReadReplicaRouter:
+    """Sends myapp reads to the read-only replica alias."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'myapp':
+            return None
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {'default', REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA:
+            return False
+        return None
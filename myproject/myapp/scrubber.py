@@ -0,0 +1,79 @@
+"""
+Regex scrubber for personal information in review text.
+
+The patterns are compiled once, on first use, and shared by every caller
+(check_privacy_risk, make_review_private and the batch paths).
+"""
+import re
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def _patterns():
+    """Compiled (pattern, replacement) pairs, in the order they are applied."""
+    # Pattern for email addresses
+    email_patterns = [
+        r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
+    ]
+    # Pattern for phone numbers (various formats)
+    # More specific patterns to avoid false positives like years
+    phone_patterns = [
+        r'\b\d{3}[-.\s]\d{3}[-.\s]\d{4}\b',  # US format with separators: 123-456-7890
+        r'\b\(\d{3}\)\s?\d{3}[-.\s]?\d{4}\b',  # (123) 456-7890
+        r'\b\d{3}[-.\s]\d{3}[-.\s]\d{4}\b',  # 123.456.7890 or 123 456 7890
+        r'\b\+?\d{1,3}[-.\s]\d{1,4}[-.\s]\d{1,4}[-.\s]\d{1,9}\b',  # International with separators
+        # 10 consecutive digits but not at start of line (to avoid matching years in dates)
+        r'(?<!\d)\d{10}(?!\d)',  # 10 digits not preceded or followed by digits
+    ]
+    # Pattern for common name indicators (e.g., "My name is John", "I'm Sarah")
+    name_patterns = [
+        r'\b(?:my name is|i\'?m|i am|this is|call me|named|i go by)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?\b',
+        r'\b(?:signed|from|yours)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?\b',  # Email signatures
+        # Pattern for standalone capitalized names (likely to be names if not common words)
+        r'\b(?:hi|hello|hey|dear)\s+[A-Z][a-z]{2,}\b',  # "Hi John" or "Hello Sarah"
+    ]
+    # Pattern for ID numbers with common prefixes
+    id_prefix_patterns = [
+        r'\b(?:id|student id|studentid|student number|student#|sid|uid|user id|userid)\s*:?\s*[A-Z0-9]{4,}\b',
+        r'\b(?:id|student id|studentid|student number|student#|sid|uid|user id|userid)\s*:?\s*\d{6,}\b',
+    ]
+    # Pattern for standalone ID numbers (6-12 digits, likely to be IDs)
+    # But avoid matching years, phone numbers, or other common numbers
+    standalone_id_patterns = [
+        r'\b(?:id|#)\s*\d{6,12}\b',
+    ]
+    # Pattern for alphanumeric ID numbers (common in student IDs, employee IDs)
+    alphanumeric_id_patterns = [
+        r'\b[A-Z]{1,3}\d{4,10}\b|\b\d{4,10}[A-Z]{1,3}\b',
+    ]
+
+    groups = [
+        (email_patterns, 0, '[email removed]'),
+        (phone_patterns, 0, '[phone number removed]'),
+        (name_patterns, re.IGNORECASE, '[name removed]'),
+        (id_prefix_patterns, re.IGNORECASE, '[ID number removed]'),
+        (standalone_id_patterns, re.IGNORECASE, '[ID number removed]'),
+        (alphanumeric_id_patterns, 0, '[ID number removed]'),
+    ]
+    return [
+        (re.compile(pattern, flags), replacement)
+        for patterns, flags, replacement in groups
+        for pattern in patterns
+    ]
+
+
+def detect_and_remove_personal_info(text: str) -> tuple[bool, str]:
+    """
+    Detect personal information using regex patterns and remove it.
+    Returns (has_personal_info: bool, cleaned_text: str)
+    """
+    if not text:
+        return False, text
+
+    has_personal_info = False
+    for pattern, replacement in _patterns():
+        if pattern.search(text):
+            has_personal_info = True
+            text = pattern.sub(replacement, text)
+
+    return has_personal_info, text
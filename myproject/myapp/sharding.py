@@ -0,0 +1,216 @@
+"""
+Optional partitioning of ITEM rows by school across database aliases.
+
+With REVIEW_SHARDS set to a list of aliases, every review lives in the
+shard chosen by a stable hash of its school_name, so a school lives in
+exactly one shard. New reviews of a known professor inherit the school of
+their first one, but the same name can already have reviews at several
+schools, so a professor can span shards. Each shard hands out ids from its
+own range (see setup_shards), so a review id also names its shard.
+
+- School-scoped reads and writes go to one shard: shard_for_school(),
+  shard_for_id(), and SchoolShardRouter for saves of ITEM instances.
+- Professor-scoped reads go to the shards holding the professor
+  (shards_for_professor()) and merge what they return.
+- Cross-shard queries run on every shard at once through a thread pool
+  (scatter()) and the caller merges the results. Pool threads release
+  their connections after each task, like the end of a request.
+- Whole-table readers (the DP aggregates, export, snapshot, stats API,
+  management commands) read every shard in turn through iterate().
+
+With no shards configured every function returns the alias None, which
+leaves the choice to the normal routing, and scatter() calls its function
+once in the current thread.
+"""
+import heapq
+import itertools
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+# Ids of shard i start above (i + 1) * SHARD_ID_SPAN; ids below the first
+# span belong to rows still in the default database
+SHARD_ID_SPAN = 10 ** 12
+
+# Professors whose shard is remembered per process (least recently used dropped)
+PROFESSOR_CACHE_SIZE = 10000
+
+_pool = None
+_pool_lock = threading.Lock()
+_professor_shards = OrderedDict()
+_professor_shards_lock = threading.Lock()
+_professor_shards_version = None
+
+
+def shards():
+    """Aliases holding ITEM rows: the configured shards, or [None]."""
+    return list(getattr(settings, 'REVIEW_SHARDS', [])) or [None]
+
+
+def enabled():
+    return bool(getattr(settings, 'REVIEW_SHARDS', []))
+
+
+def shard_for_school(school_name):
+    """Stable shard of a school (crc32 of the name)."""
+    aliases = shards()
+    if len(aliases) == 1:
+        return aliases[0]
+    return aliases[zlib.crc32((school_name or '').encode('utf-8')) % len(aliases)]
+
+
+def shard_for_id(review_id):
+    """Shard whose id range contains review_id (None: the default database)."""
+    if not enabled():
+        return None
+    # Shard i hands out ids (i + 1) * SHARD_ID_SPAN + 1 up to (i + 2) * SHARD_ID_SPAN
+    index = (review_id - 1) // SHARD_ID_SPAN - 1
+    aliases = shards()
+    return aliases[index] if 0 <= index < len(aliases) else None
+
+
+def id_range(alias):
+    """(low, high) bounds of the ids a shard hands out: low < id <= high."""
+    if not enabled():
+        return 0, float('inf')
+    low = (shards().index(alias) + 1) * SHARD_ID_SPAN
+    return low, low + SHARD_ID_SPAN
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=len(shards()), thread_name_prefix='shard')
+    return _pool
+
+
+def _closing(fn, *args):
+    """fn(*args) in a worker thread, then drop its stale connections as a request would."""
+    try:
+        return fn(*args)
+    finally:
+        close_old_connections()
+
+
+def scatter(fn):
+    """Run fn(alias) on every shard concurrently; results in shard order."""
+    aliases = shards()
+    if len(aliases) == 1:
+        return [fn(aliases[0])]
+    return list(_get_pool().map(partial(_closing, fn), aliases))
+
+
+async def ascatter(fn):
+    """scatter() for async views, without holding up the ORM's sync thread."""
+    return await sync_to_async(_closing, thread_sensitive=False)(scatter, fn)
+
+
+def iterate(queryset, key=None, chunk_size=2000):
+    """
+    Iterate over queryset's rows on every shard, one shard after the other.
+
+    Ids grow with the shard index, so id order is kept; for any other
+    ordering pass it as key and the shards are merged in that order. A group
+    split over shards then comes out as adjacent rows with the same key,
+    which the caller has to combine (see dp.combine_rows()). A queryset
+    already bound to a database with using() is read from that one only.
+    """
+    if not enabled() or queryset._db is not None:
+        return queryset.iterator(chunk_size=chunk_size)
+    rows = [queryset.using(alias).iterator(chunk_size=chunk_size) for alias in shards()]
+    return heapq.merge(*rows, key=key) if key else itertools.chain(*rows)
+
+
+def shards_for_professor(professor_name):
+    """
+    Shards with the professor's reviews, in shard order, found by asking
+    every shard once and remembered in this process (up to
+    PROFESSOR_CACHE_SIZE professors, forgotten when rows are rewritten, e.g.
+    renamed or moved). For a professor without reviews any shard answers
+    "nothing", so the first one is returned.
+    """
+    global _professor_shards_version
+    if not enabled():
+        return [None]
+    from .versioning import get_rewrite_version
+    version = get_rewrite_version()
+    with _professor_shards_lock:
+        if version != _professor_shards_version:
+            _professor_shards.clear()
+            _professor_shards_version = version
+        aliases = _professor_shards.get(professor_name)
+        if aliases is not None:
+            _professor_shards.move_to_end(professor_name)
+            return list(aliases)
+    from .models import ITEM
+    found = scatter(lambda a: ITEM.objects.using(a).filter(professor_name=professor_name).exists())
+    aliases = [alias for alias, present in zip(shards(), found) if present]
+    if not aliases:
+        return shards()[:1]
+    with _professor_shards_lock:
+        _professor_shards[professor_name] = tuple(aliases)
+        if len(_professor_shards) > PROFESSOR_CACHE_SIZE:
+            _professor_shards.popitem(last=False)
+    return aliases
+
+
+async def ashards_for_professor(professor_name):
+    return await sync_to_async(_closing, thread_sensitive=False)(shards_for_professor, professor_name)
+
+
+def distinct_values(field, *args, **filters):
+    """Sorted distinct values of an ITEM field over all shards."""
+    from .models import ITEM
+
+    def load(alias):
+        return list(
+            ITEM.objects.using(alias).filter(*args, **filters)
+            .values_list(field, flat=True).distinct().order_by(field)
+        )
+    merged = []
+    for value in heapq.merge(*scatter(load)):
+        if not merged or merged[-1] != value:
+            merged.append(value)
+    return merged
+
+
+async def adistinct_values(field, *args, **filters):
+    return await sync_to_async(_closing, thread_sensitive=False)(partial(distinct_values, field, *args, **filters))
+
+
+class SchoolShardRouter:
+    """Sends saves and deletes of ITEM instances to their school's shard."""
+
+    def _is_item(self, model):
+        return model._meta.app_label == 'myapp' and model._meta.model_name == 'item'
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if enabled() and self._is_item(model) and instance is not None and instance.pk is not None:
+            return shard_for_id(instance.pk) or 'default'
+        return None
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if enabled() and self._is_item(model) and instance is not None:
+            if instance.pk is not None:
+                return shard_for_id(instance.pk) or 'default'
+            return shard_for_school(instance.school_name)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in getattr(settings, 'REVIEW_SHARDS', []):
+            # Shards only hold reviews
+            return app_label == 'myapp' and model_name == 'item'
+        return None
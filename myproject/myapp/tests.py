@@ -1,3 +1,462 @@
-from django.test import TestCase
+import json
+import threading
+import time
+import zlib
+from operator import itemgetter
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connections, transaction
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from . import continual, dp, llm, sharding, writer
+from .models import ITEM, TakeAgainCounter
+from .views import MAX_INGEST_BATCH, parse_review_fields
+
+
+class FakeAPIError(Exception):
+    """Stands in for google-genai's APIError, which carries the HTTP status as code."""
+
+    def __init__(self, code):
+        super().__init__(f'HTTP {code}')
+        self.code = code
+
+
+class FakeUpstream:
+    """fn for HedgedCaller.call: answers request i after delays[i], or raises errors[i]."""
+
+    def __init__(self, delays, errors=None):
+        self.delays = delays
+        self.errors = errors or {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            i = self.requests
+            self.requests += 1
+        time.sleep(self.delays[min(i, len(self.delays) - 1)])
+        if i in self.errors:
+            raise self.errors[i]
+        return f'answer {i}'
+
+
+def hedged_caller(**config):
+    return llm.HedgedCaller({
+        **llm.DEFAULTS,
+        'HEDGE_DELAY_MS': 50,
+        'MIN_HEDGE_DELAY_MS': 10,
+        'DEADLINE_MS': 2000,
+        **config,
+    })
+
+
+class HedgedCallerTests(SimpleTestCase):
+    def test_hedge_sent_after_delay_and_faster_request_wins(self):
+        caller = hedged_caller()
+        upstream = FakeUpstream([0.5, 0.01])
+        start = time.monotonic()
+        self.assertEqual(caller.call(upstream), 'answer 1')
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertEqual(caller.counters['hedged'], 1)
+        self.assertEqual(caller.counters['hedge_wins'], 1)
+
+    def test_no_hedge_when_first_request_is_fast(self):
+        caller = hedged_caller()
+        upstream = FakeUpstream([0.01])
+        self.assertEqual(caller.call(upstream), 'answer 0')
+        self.assertEqual(upstream.requests, 1)
+        self.assertEqual(caller.counters['hedged'], 0)
+
+    def test_deadline_raises_timeout(self):
+        caller = hedged_caller()
+        upstream = FakeUpstream([0.5])
+        start = time.monotonic()
+        with self.assertRaises(llm.LLMTimeout):
+            caller.call(upstream, deadline_ms=100)
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertEqual(caller.counters['deadline_exceeded'], 1)
+
+    def test_rate_limit_error_is_not_resent(self):
+        caller = hedged_caller()
+        upstream = FakeUpstream([0.01], errors={0: FakeAPIError(429)})
+        with self.assertRaises(FakeAPIError):
+            caller.call(upstream)
+        self.assertEqual(upstream.requests, 1)
+        self.assertEqual(caller.counters['retried'], 0)
+
+    def test_server_error_is_resent_within_budget(self):
+        caller = hedged_caller()
+        upstream = FakeUpstream([0.01], errors={0: FakeAPIError(503)})
+        self.assertEqual(caller.call(upstream), 'answer 1')
+        self.assertEqual(caller.counters['retried'], 1)
+
+    def test_server_error_is_not_resent_over_budget(self):
+        caller = hedged_caller(HEDGE_BUDGET=0.0)
+        caller._budget = 0.0
+        upstream = FakeUpstream([0.01], errors={0: FakeAPIError(503)})
+        with self.assertRaises(FakeAPIError):
+            caller.call(upstream)
+        self.assertEqual(upstream.requests, 1)
+
+    def test_budget_limits_hedges(self):
+        # The initial budget allows one hedge; with no refill the later slow
+        # calls just wait for their first request
+        caller = hedged_caller(HEDGE_BUDGET=0.0)
+        for _ in range(3):
+            caller.call(FakeUpstream([0.1, 0.01]))
+        self.assertEqual(caller.counters['hedged'], 1)
+
+    def test_failed_requests_are_not_timed(self):
+        caller = hedged_caller()
+        with self.assertRaises(FakeAPIError):
+            caller.call(FakeUpstream([0.01], errors={0: FakeAPIError(400)}))
+        self.assertEqual(caller.requests.total, 0)
+        caller.call(FakeUpstream([0.01]))
+        self.assertEqual(caller.requests.total, 1)
+
+    def test_is_transient(self):
+        self.assertTrue(llm.is_transient(FakeAPIError(500)))
+        self.assertTrue(llm.is_transient(ConnectionResetError()))
+        self.assertFalse(llm.is_transient(FakeAPIError(429)))
+        self.assertFalse(llm.is_transient(ValueError('bad answer')))
+
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-shared'},
+}
+
+
+def review_fields(**fields):
+    return {
+        'professor_name': 'Ada Lovelace',
+        'school_name': 'Boston University',
+        'department_name': 'Computer Science',
+        'star_rating': 4.0,
+        'course': 'CS101',
+        'difficulty': 3,
+        'would_take_agains': True,
+        'help_useful': 5,
+        'comments': 'Clear lectures.',
+        **fields,
+    }
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GroupCommitWriterTests(TransactionTestCase):
+    def test_batch_commits_together(self):
+        batch = [writer._Write(writer._insert, review_fields(course=f'CS{i}')) for i in range(3)]
+        with mock.patch.object(writer, 'bump_data_version') as bump:
+            writer.GroupCommitWriter(64, 0.005)._commit(batch)
+        bump.assert_called_once_with()
+        self.assertTrue(all(write.done.is_set() and write.error is None for write in batch))
+        self.assertEqual(ITEM.objects.count(), 3)
+        self.assertEqual(TakeAgainCounter.objects.get(professor_name='Ada Lovelace').steps, 3)
+
+    def test_failing_write_keeps_the_rest_of_the_batch(self):
+        batch = [
+            writer._Write(writer._insert, review_fields(course='CS1')),
+            writer._Write(writer._insert, review_fields(course='CS2', star_rating=None)),
+            writer._Write(writer._insert, review_fields(course='CS3')),
+        ]
+        writer.GroupCommitWriter(64, 0.005)._commit(batch)
+        self.assertIsInstance(batch[1].error, IntegrityError)
+        self.assertIsNone(batch[0].error)
+        self.assertIsNone(batch[2].error)
+        self.assertEqual(sorted(ITEM.objects.values_list('course', flat=True)), ['CS1', 'CS3'])
+
+    def test_concurrent_submissions_share_a_commit(self):
+        thread = writer.GroupCommitWriter(64, 0.5)
+        thread.start()
+        results = []
+
+        def submit(i):
+            results.append(thread.submit(writer._insert, review_fields(course=f'CS{i}')))
+            connections.close_all()
+
+        with mock.patch.object(writer, 'bump_data_version') as bump:
+            submitters = [threading.Thread(target=submit, args=(i,)) for i in range(4)]
+            for submitter in submitters:
+                submitter.start()
+            for submitter in submitters:
+                submitter.join(5)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(bump.call_count, 1)
+        self.assertEqual(ITEM.objects.count(), 4)
+
+    def test_delete_tombstones_and_counts(self):
+        review = writer.create_review(review_fields())
+        self.assertTrue(writer.delete_review(review.id))
+        self.assertFalse(writer.delete_review(review.id + 1000))
+        self.assertFalse(ITEM.objects.exists())
+        self.assertTrue(ITEM.all_objects.filter(id=review.id, is_deleted=True).exists())
+        self.assertEqual(TakeAgainCounter.objects.get(professor_name='Ada Lovelace').steps, 2)
+
+    def test_write_inside_transaction_runs_synchronously(self):
+        with mock.patch.object(writer, '_get_writer') as get_writer, transaction.atomic():
+            writer.create_review(review_fields())
+        get_writer.assert_not_called()
+        self.assertEqual(ITEM.objects.count(), 1)
+
+
+class NoNoise:
+    """rng without noise, so the counters must match the exact counts."""
+
+    def laplace(self, loc, scale):
+        return loc
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CONTINUAL_RELEASE={'EPSILON': 1.0, 'LEVELS': 3})
+class BinaryCounterTests(TestCase):
+    def test_totals_match_exact_counts_without_noise(self):
+        # 20 events overflow a 3-level tree (7 events) twice
+        events = [1.0, 0.0, 1.0, 1.0, -1.0, 0.0, 1.0, 1.0, 0.0, 1.0] * 2
+        counter = continual.BinaryCounter(TakeAgainCounter(professor_name='Ada Lovelace'), 3, 1.0)
+        for t, x in enumerate(events, start=1):
+            counter.add(x, NoNoise())
+            self.assertEqual(counter.value(), sum(events[:t]))
+            self.assertLessEqual(counter.row.steps, 7)
+
+    def test_record_adds_events_to_an_existing_counter(self):
+        ITEM.objects.create(**review_fields())
+        continual.record('Ada Lovelace', [1.0], rng=NoNoise())
+        continual.record('Ada Lovelace', [0.0, 1.0, -1.0], rng=NoNoise())
+        row = TakeAgainCounter.objects.get(professor_name='Ada Lovelace')
+        self.assertEqual(continual.noisy_count(row), 1.0)
+
+    def test_record_replays_a_missing_counter(self):
+        for would_take_again in (True, False, True):
+            ITEM.objects.create(**review_fields(would_take_agains=would_take_again))
+        ITEM.objects.create(**review_fields(would_take_agains=True, is_deleted=True))
+        # The third review was just written; its event is already in the replay
+        continual.record('Ada Lovelace', [1.0], rng=NoNoise())
+        row = TakeAgainCounter.objects.get(professor_name='Ada Lovelace')
+        self.assertEqual(row.steps, 3)
+        self.assertEqual(continual.noisy_count(row), 2.0)
+
+    def test_rebuild_replaces_counters(self):
+        ITEM.objects.create(**review_fields())
+        TakeAgainCounter.objects.create(professor_name='Ada Lovelace', steps=1, alpha=[5.0, 0.0, 0.0],
+                                        noisy_alpha=[5.0, 0.0, 0.0], base=10.0)
+        TakeAgainCounter.objects.create(professor_name='Gone Professor', steps=1, alpha=[1.0, 0.0, 0.0],
+                                        noisy_alpha=[1.0, 0.0, 0.0], base=0.0)
+        continual.rebuild(['Ada Lovelace', 'Gone Professor'], rng=NoNoise())
+        row = TakeAgainCounter.objects.get(professor_name='Ada Lovelace')
+        self.assertEqual(continual.noisy_count(row), 1.0)
+        self.assertFalse(TakeAgainCounter.objects.filter(professor_name='Gone Professor').exists())
+
+    def test_build_counters_matches_replay(self):
+        for i in range(9):
+            ITEM.objects.create(**review_fields(would_take_agains=i % 3 != 0))
+        ITEM.objects.create(**review_fields(professor_name='Alan Turing', would_take_agains=False))
+        rows = {row.professor_name: row for row in continual.build_counters(rng=NoNoise())}
+        self.assertEqual(continual.noisy_count(rows['Ada Lovelace']), 6.0)
+        self.assertEqual(continual.noisy_count(rows['Alan Turing']), 0.0)
+        self.assertEqual(continual.noisy_count(continual.replay('Ada Lovelace', rng=NoNoise())), 6.0)
+
+
+SHARDS = ['reviews_0', 'reviews_1', 'reviews_2']
+
+
+@override_settings(REVIEW_SHARDS=SHARDS)
+class ShardRoutingTests(SimpleTestCase):
+    def test_school_shard_is_crc32_of_the_name(self):
+        for school in ('Boston University', 'Harvard University', 'MIT', ''):
+            expected = SHARDS[zlib.crc32(school.encode('utf-8')) % len(SHARDS)]
+            self.assertEqual(sharding.shard_for_school(school), expected)
+        self.assertEqual(sharding.shard_for_school(None), sharding.shard_for_school(''))
+
+    def test_ids_name_their_shard(self):
+        for alias in SHARDS:
+            low, high = sharding.id_range(alias)
+            self.assertEqual(sharding.shard_for_id(low + 1), alias)
+            self.assertEqual(sharding.shard_for_id(high), alias)
+        # Ids below the first span are still in the default database
+        self.assertIsNone(sharding.shard_for_id(42))
+        self.assertIsNone(sharding.shard_for_id(4 * sharding.SHARD_ID_SPAN + 1))
+
+    @override_settings(REVIEW_SHARDS=[])
+    def test_without_shards_everything_is_default(self):
+        self.assertEqual(sharding.shards(), [None])
+        self.assertIsNone(sharding.shard_for_school('Boston University'))
+        self.assertIsNone(sharding.shard_for_id(sharding.SHARD_ID_SPAN + 1))
+        self.assertEqual(sharding.scatter(lambda alias: alias), [None])
+        self.assertIsNone(sharding.SchoolShardRouter().db_for_write(ITEM, instance=ITEM(**review_fields())))
+
+    def test_router_sends_reviews_to_their_shard(self):
+        router = sharding.SchoolShardRouter()
+        review = ITEM(**review_fields())
+        self.assertEqual(router.db_for_write(ITEM, instance=review), sharding.shard_for_school(review.school_name))
+        self.assertIsNone(router.db_for_read(ITEM, instance=review))
+        review.pk = sharding.id_range('reviews_1')[0] + 7
+        self.assertEqual(router.db_for_write(ITEM, instance=review), 'reviews_1')
+        self.assertEqual(router.db_for_read(ITEM, instance=review), 'reviews_1')
+        review.pk = 7
+        self.assertEqual(router.db_for_write(ITEM, instance=review), 'default')
+        self.assertIsNone(router.db_for_write(TakeAgainCounter, instance=TakeAgainCounter()))
+
+    def test_shards_only_migrate_reviews(self):
+        router = sharding.SchoolShardRouter()
+        self.assertTrue(router.allow_migrate('reviews_0', 'myapp', model_name='item'))
+        self.assertFalse(router.allow_migrate('reviews_0', 'myapp', model_name='takeagaincounter'))
+        self.assertFalse(router.allow_migrate('reviews_0', 'auth', model_name='user'))
+        self.assertIsNone(router.allow_migrate('default', 'myapp', model_name='item'))
+
+    def test_scatter_runs_on_every_shard_in_order(self):
+        self.assertEqual(sharding.scatter(lambda alias: alias.upper()), [alias.upper() for alias in SHARDS])
+
+    def test_combine_rows_merges_a_professor_split_over_shards(self):
+        rows = [
+            {'professor_name': 'Ada Lovelace', 'n': 2, 'rating_sum': 8.0, 'difficulty_sum': 6, 'helpful_sum': 10,
+             'take_again': 1, 'first_id': 30},
+            {'professor_name': 'Ada Lovelace', 'n': 1, 'rating_sum': 5.0, 'difficulty_sum': 2, 'helpful_sum': None,
+             'take_again': 1, 'first_id': 12},
+            {'professor_name': 'Alan Turing', 'n': 1, 'rating_sum': 3.0, 'difficulty_sum': 4, 'helpful_sum': 7,
+             'take_again': 0, 'first_id': 20},
+        ]
+        merged = list(dp.combine_rows(rows, key=itemgetter('professor_name')))
+        self.assertEqual(len(merged), 2)
+        self.assertEqual(merged[0], {
+            'professor_name': 'Ada Lovelace', 'n': 3, 'rating_sum': 13.0, 'difficulty_sum': 8, 'helpful_sum': 10,
+            'take_again': 2, 'first_id': 12,
+        })
+        self.assertEqual(merged[1], rows[2])
+        self.assertEqual(dp.sum_aggregates([{'n': 2, 'rating_sum': None}, {'n': 1, 'rating_sum': 4.0}]),
+                         {'n': 3, 'rating_sum': 4.0})
+
+
+class ParseReviewFieldsTests(SimpleTestCase):
+    def test_coerces_and_clamps(self):
+        fields, missing_fields = parse_review_fields({
+            'course': ' CS101 ', 'difficulty': '3', 'help_useful': '42', 'rating': '4.5',
+            'would_take_agains': True, 'message': ' Great. ',
+        })
+        self.assertEqual(missing_fields, [])
+        self.assertEqual(fields, {
+            'course': 'CS101', 'difficulty': 3, 'help_useful': 10, 'star_rating': 4.5,
+            'would_take_agains': True, 'comments': 'Great.',
+        })
+        fields, _ = parse_review_fields({'help_useful': '-5', 'would_take_agains': 'false'})
+        self.assertEqual(fields['help_useful'], 1)
+        self.assertIs(fields['would_take_agains'], False)
+
+    def test_reports_missing_and_invalid_fields(self):
+        _, missing_fields = parse_review_fields({
+            'course': '', 'difficulty': 'hard', 'help_useful': None, 'rating': 'five',
+            'would_take_agains': 'maybe',
+        })
+        self.assertEqual(missing_fields, ['course', 'difficulty', 'help_useful', 'rating', 'would_take_agains', 'message'])
+
+
+def ingest_item(**fields):
+    return {
+        'professor_name': 'Ada  Lovelace', 'school_name': 'Boston University', 'course': 'CS101',
+        'difficulty': 3, 'help_useful': 5, 'rating': 4, 'would_take_agains': True, 'message': 'Clear lectures.',
+        **fields,
+    }
+
+
+@override_settings(CACHES=LOCMEM_CACHES, INGEST_API_TOKEN='ingest-secret')
+class IngestReviewsTests(TestCase):
+    url = '/api/reviews/ingest/'
+
+    def post(self, payload, client=None, token='ingest-secret'):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return (client or self.client).post(self.url, json.dumps(payload), content_type='application/json',
+                                            headers=headers)
+
+    def test_creates_valid_reviews_and_reports_invalid_ones(self):
+        response = self.post({'reviews': [
+            ingest_item(help_useful=99, message='x' * 400),
+            ingest_item(rating='', message=''),
+            'not a review',
+        ]})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['created'], 1)
+        self.assertEqual(data['results'][0]['status'], 'created')
+        self.assertEqual(data['results'][1], {'index': 1, 'status': 'error', 'missing_fields': ['rating', 'message']})
+        self.assertEqual(data['results'][2]['status'], 'error')
+        review = ITEM.objects.get()
+        self.assertEqual(review.professor_name, 'Ada Lovelace')
+        self.assertEqual(review.help_useful, 10)
+        self.assertEqual(len(review.comments), ITEM._meta.get_field('comments').max_length)
+        self.assertTrue(review.needs_anonymization)
+        self.assertEqual(TakeAgainCounter.objects.get(professor_name='Ada Lovelace').steps, 1)
+
+    def test_known_professor_keeps_their_school(self):
+        ITEM.objects.create(**review_fields(school_name='Harvard University'))
+        self.post({'reviews': [ingest_item(professor_name='Ada Lovelace')]})
+        self.assertEqual(set(ITEM.objects.values_list('school_name', flat=True)), {'Harvard University'})
+
+    def test_rejects_bad_input(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertEqual(self.post({'reviews': []}).status_code, 400)
+        self.assertEqual(self.post({'reviews': {'course': 'CS101'}}).status_code, 400)
+        self.assertEqual(self.post({'reviews': [ingest_item()] * (MAX_INGEST_BATCH + 1)}).status_code, 400)
+        response = self.client.post(self.url, 'not json', content_type='application/json',
+                                    headers={'Authorization': 'Bearer ingest-secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ITEM.objects.exists())
+
+    def test_requires_token_or_staff_session(self):
+        self.assertEqual(self.post({'reviews': [ingest_item()]}, token=None).status_code, 401)
+        self.assertEqual(self.post({'reviews': [ingest_item()]}, token='wrong').status_code, 401)
+        user = User.objects.create_user('student', password='pw')
+        self.client.force_login(user)
+        self.assertEqual(self.post({'reviews': [ingest_item()]}, token=None).status_code, 401)
+        self.assertFalse(ITEM.objects.exists())
+
+        staff = User.objects.create_user('moderator', password='pw', is_staff=True)
+        csrf_client = Client(enforce_csrf_checks=True)
+        csrf_client.force_login(staff)
+        self.assertEqual(self.post({'reviews': [ingest_item()]}, client=csrf_client, token=None).status_code, 403)
+        self.client.force_login(staff)
+        self.assertEqual(self.post({'reviews': [ingest_item()]}, token=None).status_code, 200)
+        self.assertEqual(ITEM.objects.count(), 1)
+
+    @override_settings(INGEST_API_TOKEN='')
+    def test_no_token_configured_rejects_bearer_requests(self):
+        self.assertEqual(self.post({'reviews': [ingest_item()]}, token='').status_code, 401)
+        self.assertEqual(self.post({'reviews': [ingest_item()]}, token='anything').status_code, 401)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AsyncReadViewTests(TransactionTestCase):
+    # The async views read through other threads, so the rows must be committed
+
+    def setUp(self):
+        for i in range(5):
+            ITEM.objects.create(**review_fields(course=f'CS{i}'))
+        ITEM.objects.create(**review_fields(professor_name='Alan Turing', school_name='Harvard University'))
+        self.ids = list(ITEM.objects.filter(professor_name='Ada Lovelace').order_by('id').values_list('id', flat=True))
+
+    async def test_home_counts(self):
+        response = await self.async_client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_professors'], 2)
+        self.assertEqual(response.context['total_schools'], 2)
+        self.assertEqual(response.context['total_reviews'], 6)
+
+    async def test_professor_profile(self):
+        response = await self.async_client.get('/professor/Ada Lovelace/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'CS0')
+
+    async def test_reviews_api_pages_by_id(self):
+        response = await self.async_client.get('/api/professor/Ada Lovelace/reviews/', {'after': 0, 'limit': 3})
+        data = response.json()
+        self.assertEqual([row['id'] for row in data['reviews']], self.ids[:3])
+        self.assertEqual(data['next_cursor'], self.ids[2])
+        response = await self.async_client.get('/api/professor/Ada Lovelace/reviews/',
+                                               {'after': data['next_cursor'], 'limit': 3})
+        data = response.json()
+        self.assertEqual([row['id'] for row in data['reviews']], self.ids[3:])
+        self.assertIsNone(data['next_cursor'])
+        response = await self.async_client.get('/api/professor/Ada Lovelace/reviews/', {'after': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_search_redirects_to_a_single_match(self):
+        response = await self.async_client.get('/search/', {'q': 'Turing'})
+        self.assertRedirects(response, '/professor/Alan%20Turing/', fetch_redirect_response=False)
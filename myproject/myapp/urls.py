@@ -1,5 +1,5 @@
 from django.urls import path 
-from .views import home, showitems, professor_dropdown, professor_profile, search_prof, WriteReview, WriteReviewBlank, Databaseshow, delete_review, check_privacy_risk
+from .views import home, showitems, professor_dropdown, professor_profile, search_prof, WriteReview, WriteReviewBlank, Databaseshow, delete_review, moderate_reviews, check_privacy_risk, school_overview, school_departments, professor_stats_api, privacy_check_stats, export_data, ingest_reviews, professor_reviews_api, recent_profiles, download_profile, snapshot_query
 
 urlpatterns = [
     path('', home, name='home'),
@@ -7,9 +7,20 @@ urlpatterns = [
     path('search/', search_prof, name='search_prof'),
     path('professors/', professor_dropdown, name='professor_dropdown'),
     path('professor/<str:professor_name>/', professor_profile, name='professor_profile'),
+    path('schools/', school_overview, name='school_overview'),
+    path('schools/<str:school_name>/', school_departments, name='school_departments'),
     path('write/', WriteReviewBlank, name='WriteReviewBlank'),
     path('write/<str:professor_name>/', WriteReview, name='WriteReview'),
     path('datashow/', Databaseshow, name='Databaseshow'),
+    path('datashow/moderate/', moderate_reviews, name='moderate_reviews'),
+    path('internal/profiles/', recent_profiles, name='recent_profiles'),
+    path('internal/profiles/<str:profile_id>/', download_profile, name='download_profile'),
+    path('api/snapshot/query/', snapshot_query, name='snapshot_query'),
+    path('export/', export_data, name='export_data'),
     path('review/<int:review_id>/delete/', delete_review, name='delete_review'),
     path('api/check-privacy-risk/', check_privacy_risk, name='check_privacy_risk'),
+    path('api/check-privacy-risk/stats/', privacy_check_stats, name='privacy_check_stats'),
+    path('api/professor/<str:professor_name>/reviews/', professor_reviews_api, name='professor_reviews_api'),
+    path('api/professors/stats/', professor_stats_api, name='professor_stats_api'),
+    path('api/reviews/ingest/', ingest_reviews, name='ingest_reviews'),
 ]
@@ -0,0 +1,63 @@
+"""
+Data-version stamp for cached results.
+
+Anything derived from the ITEM table (cached DP releases, name lists) is
+keyed on the current data version. Write and delete paths call
+bump_data_version() so the next read recomputes instead of serving stale data.
+
+Appends and deletes are all most caches need to catch up incrementally.
+Writes that change existing rows in place (e.g. fix_spacing renaming
+professors) pass rewrite=True, which also bumps a rewrite version; caches
+that only append (the columnar snapshot) rebuild when it changes.
+
+The stamps live in the DATA_VERSION_CACHE alias ('shared' in settings), which
+every worker process reads, so a write in one worker invalidates the
+per-process caches of all of them. Backends without an atomic incr (the file
+cache) can lose one of two concurrent bumps, but either way the version
+changes, which is all readers compare.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+DATA_VERSION_KEY = 'myapp:data_version'
+REWRITE_VERSION_KEY = 'myapp:rewrite_version'
+
+
+def _cache():
+    return caches[getattr(settings, 'DATA_VERSION_CACHE', 'default')]
+
+
+def _get(key):
+    cache = _cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump(key):
+    cache = _cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key missing (e.g. evicted): restart from a fresh version
+        cache.set(key, 2, timeout=None)
+        return 2
+
+
+def get_data_version():
+    """Return the current data version, starting at 1."""
+    return _get(DATA_VERSION_KEY)
+
+
+def get_rewrite_version():
+    """Return the current rewrite version (bumped by in-place updates), starting at 1."""
+    return _get(REWRITE_VERSION_KEY)
+
+
+def bump_data_version(rewrite=False):
+    """Invalidate everything keyed on the data version; rewrite=True for in-place updates."""
+    if rewrite:
+        _bump(REWRITE_VERSION_KEY)
+    return _bump(DATA_VERSION_KEY)
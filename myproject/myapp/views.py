@@ -1,29 +1,43 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, JsonResponse
-from django.contrib.auth.models import User
-from django.contrib.auth import login, authenticate
+from django.urls import reverse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
-from django.http import HttpResponse
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.contrib.admin.views.decorators import staff_member_required
+from django.middleware.csrf import CsrfViewMiddleware
 from django.views.decorators.csrf import csrf_exempt
-from .models import ITEM
+from asgiref.sync import sync_to_async
+from .models import ITEM, TakeAgainCounter
+from . import llm, namecache, profiling, sharding, writer
+from .admission import AdmissionController
+from .lazy import lazy_import
+from .llm import get_gemini_client
+from .scrubber import detect_and_remove_personal_info
+from .versioning import bump_data_version
 from django.conf import settings
+import asyncio
+import heapq
+import hmac
 import json
-import numpy as np
-import re
+import itertools
+import math
+import os
+from operator import itemgetter
+from urllib.parse import urlencode
 
-try:
-    from google import genai
-except Exception:
-    genai = None
+# NumPy and the DP engine are loaded on first use, not when views.py is imported
+np = lazy_import('numpy')
+dp = lazy_import('myapp.dp')
+aggregates = lazy_import('myapp.aggregates')
+export = lazy_import('myapp.export')
+dedup = lazy_import('myapp.dedup')
+columnar = lazy_import('myapp.columnar')
+continual = lazy_import('myapp.continual')
 
-# Initialize Gemini client if available
-_gemini_client = None
-if genai is not None and getattr(settings, 'GEMINI_API_KEY', ''):
-    try:
-        _gemini_client = genai.Client(api_key=settings.GEMINI_API_KEY)
-    except Exception:
-        _gemini_client = None
+# Rate limiting and LLM concurrency cap for check_privacy_risk
+privacy_check_admission = AdmissionController.from_settings('PRIVACY_CHECK_ADMISSION')
 
 
 def dp_average(ratings, a, b, epsilon):
@@ -98,90 +112,32 @@ def dp_helpful_average(helpful, a, b, epsilon):
 
 
 
-def detect_and_remove_personal_info(text: str) -> tuple[bool, str]:
-    """
-    Detect personal information using regex patterns and remove it.
-    Returns (has_personal_info: bool, cleaned_text: str)
-    """
-    if not text:
-        return False, text
-    
-    original_text = text
-    has_personal_info = False
-    
-    # Pattern for email addresses
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    if re.search(email_pattern, text):
-        has_personal_info = True
-        text = re.sub(email_pattern, '[email removed]', text)
-    
-    # Pattern for phone numbers (various formats)
-    # More specific patterns to avoid false positives like years
-    phone_patterns = [
-        r'\b\d{3}[-.\s]\d{3}[-.\s]\d{4}\b',  # US format with separators: 123-456-7890
-        r'\b\(\d{3}\)\s?\d{3}[-.\s]?\d{4}\b',  # (123) 456-7890
-        r'\b\d{3}[-.\s]\d{3}[-.\s]\d{4}\b',  # 123.456.7890 or 123 456 7890
-        r'\b\+?\d{1,3}[-.\s]\d{1,4}[-.\s]\d{1,4}[-.\s]\d{1,9}\b',  # International with separators
-        # 10 consecutive digits but not at start of line (to avoid matching years in dates)
-        r'(?<!\d)\d{10}(?!\d)',  # 10 digits not preceded or followed by digits
-    ]
-    for pattern in phone_patterns:
-        if re.search(pattern, text):
-            has_personal_info = True
-            text = re.sub(pattern, '[phone number removed]', text)
-    
-    # Pattern for common name indicators (e.g., "My name is John", "I'm Sarah")
-    name_patterns = [
-        r'\b(?:my name is|i\'?m|i am|this is|call me|named|i go by)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?\b',
-        r'\b(?:signed|from|yours)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+)?\b',  # Email signatures
-        # Pattern for standalone capitalized names (likely to be names if not common words)
-        r'\b(?:hi|hello|hey|dear)\s+[A-Z][a-z]{2,}\b',  # "Hi John" or "Hello Sarah"
-    ]
-    for pattern in name_patterns:
-        if re.search(pattern, text, re.IGNORECASE):
-            has_personal_info = True
-            text = re.sub(pattern, '[name removed]', text, flags=re.IGNORECASE)
-    
-    
-    # Pattern for ID numbers with common prefixes
-    id_prefix_patterns = [
-        r'\b(?:id|student id|studentid|student number|student#|sid|uid|user id|userid)\s*:?\s*[A-Z0-9]{4,}\b',
-        r'\b(?:id|student id|studentid|student number|student#|sid|uid|user id|userid)\s*:?\s*\d{6,}\b',
-    ]
-    for pattern in id_prefix_patterns:
-        if re.search(pattern, text, re.IGNORECASE):
-            has_personal_info = True
-            text = re.sub(pattern, '[ID number removed]', text, flags=re.IGNORECASE)
-    
-    # Pattern for standalone ID numbers (6-12 digits, likely to be IDs)
-    # But avoid matching years, phone numbers, or other common numbers
-    standalone_id_pattern = r'\b(?:id|#)\s*\d{6,12}\b'
-    if re.search(standalone_id_pattern, text, re.IGNORECASE):
-        has_personal_info = True
-        text = re.sub(standalone_id_pattern, '[ID number removed]', text, flags=re.IGNORECASE)
-    
-    # Pattern for alphanumeric ID numbers (common in student IDs, employee IDs)
-    alphanumeric_id_pattern = r'\b[A-Z]{1,3}\d{4,10}\b|\b\d{4,10}[A-Z]{1,3}\b'
-    if re.search(alphanumeric_id_pattern, text):
-        has_personal_info = True
-        text = re.sub(alphanumeric_id_pattern, '[ID number removed]', text)
-    
-    
-    return has_personal_info, text
-
-
 def make_review_private(review_text: str) -> str:
     """Use Gemini to anonymize the review text. If unavailable, return original."""
+    return _make_review_private(review_text)[0]
+
+
+def _make_review_private(review_text: str) -> tuple[str, bool]:
+    """make_review_private() plus whether Gemini checked the text (False: regex scrub only)."""
     if not review_text:
-        return review_text
+        return review_text, True
     
     # First, use regex to remove obvious personal info
     has_personal, cleaned = detect_and_remove_personal_info(review_text)
     if has_personal:
         review_text = cleaned
     
-    if _gemini_client is None:
-        return review_text
+    gemini_client = get_gemini_client()
+    if gemini_client is None:
+        return review_text, False
+
+    # A near-duplicate that Gemini left unchanged: this text needs no rewrite
+    # either. A rewrite is never reused, since it is another review's text.
+    anonymized = dedup.anonymized_reviews()
+    previous = anonymized.lookup(review_text)
+    if previous is not None and previous.get('changed') is False:
+        anonymized.record_reuse()
+        return review_text, True
 
     prompt = f"""
 You are an AI assistant ensuring differential privacy in student reviews.
@@ -200,14 +156,58 @@ Return only the cleaned review, nothing else.
 """
 
     try:
-        response = _gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-        )
+        response = llm.generate_content(gemini_client, prompt, name='make_private')
         cleaned = response.text.strip() if getattr(response, 'text', None) else review_text
-        return cleaned or review_text
+        if cleaned:
+            dedup.anonymized_reviews().add(review_text, {'changed': cleaned != review_text})
+        return cleaned or review_text, bool(cleaned)
     except Exception:
-        return review_text
+        return review_text, False
+
+
+def make_reviews_private(review_texts: list[str]) -> tuple[list[str], list[bool]]:
+    """
+    Anonymize several reviews with one Gemini call. Falls back to
+    make_review_private per review if the batch answer can't be used.
+
+    Returns the texts and, per text, whether Gemini checked it; the others
+    only got the regex scrub (no client, or the call failed).
+    """
+    if not review_texts:
+        return [], []
+    gemini_client = get_gemini_client()
+    cleaned_texts = [detect_and_remove_personal_info(text)[1] for text in review_texts]
+    if gemini_client is None:
+        return cleaned_texts, [False] * len(cleaned_texts)
+
+    prompt = f"""
+You are an AI assistant ensuring differential privacy in student reviews.
+
+Here is a JSON array of {len(cleaned_texts)} student reviews of professors:
+---
+{json.dumps(cleaned_texts)}
+---
+
+For each review, if it contains personal or identifying information (like the student's name, schedule, project topic, group name, nationality, unique incidents, or specific grades),
+rewrite it in a way that keeps the general opinion but removes or generalizes any identifying details, Also if it has email or phone number or name remove them.
+
+If a review is already anonymous and safe, return it unchanged.
+
+Return only a JSON array of the {len(cleaned_texts)} cleaned reviews in the same order, nothing else.
+"""
+
+    try:
+        response = llm.generate_content(gemini_client, prompt, name='make_private_batch')
+        raw = response.text.strip() if getattr(response, 'text', None) else ''
+        result = json.loads(raw[raw.find('['):raw.rfind(']') + 1])
+        if (isinstance(result, list) and len(result) == len(cleaned_texts)
+                and all(isinstance(text, str) for text in result)):
+            return ([text.strip() or original for text, original in zip(result, cleaned_texts)],
+                    [True] * len(cleaned_texts))
+    except Exception:
+        pass
+    results = [_make_review_private(text) for text in review_texts]
+    return [text for text, _ in results], [checked for _, checked in results]
 
 
 @csrf_exempt
@@ -216,6 +216,13 @@ def check_privacy_risk(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
     
+    # Per-client token bucket: shed excess requests before doing any work
+    retry_after = privacy_check_admission.check_rate(request)
+    if retry_after:
+        response = JsonResponse({'error': 'Too many requests, please slow down'}, status=429)
+        response['Retry-After'] = str(math.ceil(retry_after))
+        return response
+    
     try:
         data = json.loads(request.body)
         review_text = data.get('review_text', '').strip()
@@ -233,22 +240,58 @@ def check_privacy_risk(request):
     has_personal_info, regex_cleaned = detect_and_remove_personal_info(review_text)
     
     # If Gemini is not available, use regex-based detection
-    if _gemini_client is None:
+    gemini_client = get_gemini_client()
+    if gemini_client is None:
+        return _regex_only_response(review_text, has_personal_info, regex_cleaned, 'AI service unavailable')
+    
+    # Reuse a "low" verdict of an already-checked near-duplicate (compared
+    # after regex scrubbing). Only the verdict is reused: the text returned is
+    # always built from this review. A "high" near-duplicate needs its own
+    # rewrite, so it goes to Gemini like a new text.
+    verdicts = dedup.privacy_verdicts()
+    previous = verdicts.lookup(regex_cleaned)
+    if previous is not None and previous['risk_level'] == 'low':
+        verdicts.record_reuse()
         if has_personal_info:
-            return JsonResponse({
-                'risk_level': 'high',
-                'original_text': review_text,
-                'rephrased_text': regex_cleaned,
-                'error': 'AI service unavailable, using pattern-based detection'
-            })
+            risk_level, rephrased_text = 'high', regex_cleaned
         else:
-            return JsonResponse({
-                'risk_level': 'low',
-                'original_text': review_text,
-                'rephrased_text': review_text,
-                'error': 'AI service unavailable'
-            })
+            risk_level, rephrased_text = 'low', review_text
+        return JsonResponse({
+            'risk_level': risk_level,
+            'original_text': review_text,
+            'rephrased_text': rephrased_text,
+            'near_duplicate': True
+        })
     
+    # Over the concurrent LLM call cap: answer from the regex check right away
+    # instead of queueing behind slow Gemini calls
+    if not privacy_check_admission.acquire_slot():
+        return _regex_only_response(review_text, has_personal_info, regex_cleaned, 'AI service busy')
+    try:
+        return _llm_privacy_check(gemini_client, review_text, has_personal_info, regex_cleaned)
+    finally:
+        privacy_check_admission.release_slot()
+
+
+def _regex_only_response(review_text, has_personal_info, regex_cleaned, reason):
+    """Privacy check result from the regex detection alone."""
+    if has_personal_info:
+        return JsonResponse({
+            'risk_level': 'high',
+            'original_text': review_text,
+            'rephrased_text': regex_cleaned,
+            'error': f'{reason}, using pattern-based detection'
+        })
+    return JsonResponse({
+        'risk_level': 'low',
+        'original_text': review_text,
+        'rephrased_text': review_text,
+        'error': reason
+    })
+
+
+def _llm_privacy_check(gemini_client, review_text, has_personal_info, regex_cleaned):
+    """Ask Gemini for the risk level, falling back to the regex result on errors."""
     # Use the regex-cleaned version for AI analysis if personal info was found
     text_for_analysis = regex_cleaned if has_personal_info else review_text
     
@@ -297,10 +340,7 @@ or
 """
     
     try:
-        response = _gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-        )
+        response = llm.generate_content(gemini_client, prompt, name='privacy_check')
         raw = response.text.strip() if getattr(response, 'text', None) else ''
         
         # extract JSON from the response
@@ -348,6 +388,9 @@ or
                 # Still apply regex as a safety check
                 rephrased_text = final_cleaned if final_cleaned != rephrased_text else rephrased_text
             
+            if risk_level in ('high', 'low'):
+                dedup.privacy_verdicts().add(regex_cleaned, {'risk_level': risk_level})
+            
             return JsonResponse({
                 'risk_level': risk_level,
                 'original_text': review_text,
@@ -395,29 +438,211 @@ or
             'error': str(e)
         })
 
+def privacy_check_stats(request):
+    """Admission-control, near-duplicate cache and Gemini call counters for check_privacy_risk in this worker process."""
+    return JsonResponse({**privacy_check_admission.stats(), 'near_duplicates': dedup.stats(), 'gemini': llm.stats()})
+
+
+@staff_member_required
+def recent_profiles(request):
+    """Recent request profiles recorded by RequestProfilerMiddleware (see profiling.py)."""
+    return JsonResponse({'profiles': profiling.recent_profiles()})
+
+
+@staff_member_required
+def download_profile(request, profile_id):
+    """One stored profile: ?file=meta for the metadata and SQL, else the pstats/speedscope file."""
+    path = profiling.profile_path(profile_id, 'meta' if request.GET.get('file') == 'meta' else 'profile')
+    if path is None:
+        return JsonResponse({'error': 'Profile not found'}, status=404)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+
+
+# Fields the stats API can return (name is always included)
+STATS_API_FIELDS = (
+    'school_name', 'department_name', 'total_reviews', 'average_rating',
+    'average_difficulty', 'average_help_useful', 'would_take_again_percent', 'histograms',
+)
+STATS_API_BATCH = 500
+
+
+def _stats_api_params(request):
+    """Read names / ids / school / fields / stream from a GET query or a JSON body."""
+    if request.method == 'POST':
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError('Request body must be a JSON object')
+        names = data.get('names') or []
+        ids = data.get('ids') or []
+        if not isinstance(names, list) or not isinstance(ids, list):
+            raise ValueError('names and ids must be lists')
+        school = (data.get('school') or '').strip()
+        fields = data.get('fields') or []
+        stream = bool(data.get('stream'))
+    else:
+        names = request.GET.getlist('name') + [
+            n for n in request.GET.get('names', '').split(',') if n.strip()
+        ]
+        ids = request.GET.getlist('id')
+        school = request.GET.get('school', '').strip()
+        fields = [f for f in request.GET.get('fields', '').split(',') if f.strip()]
+        stream = request.GET.get('stream', '') in ('1', 'true')
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    names = [' '.join(str(n).split()) for n in names if str(n).strip()]
+    ids = [int(i) for i in ids]
+    fields = [f.strip() for f in fields] or [f for f in STATS_API_FIELDS if f != 'histograms']
+    unknown = [f for f in fields if f not in STATS_API_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names, ids, school, fields, stream
+
+
+def _iter_stats_api_rows(reviews, fields):
+    """Noisy per-professor rows, with histograms added batch by batch if requested."""
+    releases = dp.iter_professor_releases(reviews, batch_size=STATS_API_BATCH)
+    while True:
+        batch = list(itertools.islice(releases, STATS_API_BATCH))
+        if not batch:
+            return
+        histograms = {}
+        if 'histograms' in fields:
+            names = [row['name'] for row in batch]
+            histograms = dp.dp_histograms_bulk(reviews.filter(professor_name__in=names))
+        for row in batch:
+            row['histograms'] = histograms.get(row['name'])
+            if row['histograms'] and getattr(settings, 'DP_MEAN_FROM_HISTOGRAM', False):
+                # Same as professor_profile: the means come from the histograms,
+                # so requesting them doesn't spend the budget a second time
+                row['average_rating'] = round(row['histograms']['rating']['mean'], 1)
+                row['average_difficulty'] = round(row['histograms']['difficulty']['mean'], 1)
+                row['average_help_useful'] = round(row['histograms']['helpful']['mean'], 1)
+            yield {'name': row['name'], **{f: row[f] for f in fields}}
+
+
+@csrf_exempt
+def professor_stats_api(request):
+    """DP statistics for many professors (by name, review id or school) as compact JSON."""
+    if request.method not in ('GET', 'POST'):
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    try:
+        names, ids, school, fields, stream = _stats_api_params(request)
+    except (json.JSONDecodeError, ValueError, TypeError) as e:
+        return JsonResponse({'error': f'Invalid request data: {e}'}, status=400)
+    if not (names or ids or school):
+        return JsonResponse({'error': 'Provide names, ids or school'}, status=400)
+
+    # Resolve the professors requested by review id first (on every shard: the
+    # professor's other reviews may be on another one); professors selected
+    # by school only get their reviews at that school
+    names = set(names)
+    if ids:
+        names.update(sharding.distinct_values('professor_name', id__in=ids))
+    reviews_filter = models.Q()
+    if names:
+        reviews_filter |= models.Q(professor_name__in=names)
+    if school:
+        reviews_filter |= models.Q(school_name=school)
+    reviews = ITEM.objects.filter(reviews_filter)
+
+    rows = _iter_stats_api_rows(reviews, fields)
+    if not stream:
+        professors = list(rows)
+        return JsonResponse({'count': len(professors), 'professors': professors},
+                            json_dumps_params={'separators': (',', ':')})
+
+    def chunks():
+        yield '{"professors":['
+        for i, row in enumerate(rows):
+            yield (',' if i else '') + json.dumps(row, separators=(',', ':'))
+        yield ']}'
+
+    return StreamingHttpResponse(chunks(), content_type='application/json')
+
+
+async def _alist(queryset):
+    # Evaluate a queryset from async code (templates can't query lazily in async views)
+    return [row async for row in queryset]
+
+
+def export_data(request):
+    """Stream DP aggregates or scrubbed comments as NDJSON/CSV from a server-side cursor."""
+    mode = request.GET.get('mode', 'aggregates')
+    fmt = request.GET.get('format', 'ndjson')
+    if mode not in export.MODES or fmt not in export.FORMATS:
+        return JsonResponse({'error': 'Invalid mode or format'}, status=400)
+    queryset = ITEM.objects.all()
+    school = request.GET.get('school', '').strip()
+    if school:
+        queryset = queryset.filter(school_name=school)
+
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export.iter_lines(mode, fmt, queryset), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{mode}.{fmt}"'
+    return response
+
+
+def snapshot_query(request):
+    """
+    Ad-hoc DP statistics from the columnar snapshot, e.g.
+    ?school=MIT&department=Physics&group_by=course. Filters can repeat
+    (?school=MIT&school=Harvard); take_again=1/0 filters on that answer.
+    Group sizes are noisy, and groups smaller than MIN_GROUP_SIZE are left out.
+    """
+    filters = {}
+    for name in columnar.CATEGORICAL:
+        values = [v for v in request.GET.getlist(name) if v]
+        if values:
+            filters[name] = values
+    take_again = request.GET.get('take_again', '').strip().lower()
+    if take_again:
+        if take_again not in ('1', '0', 'true', 'false'):
+            return JsonResponse({'error': 'take_again must be 1 or 0'}, status=400)
+        filters['take_again'] = take_again in ('1', 'true')
+    group_by = [g for g in request.GET.get('group_by', '').split(',') if g]
+    if any(g not in columnar.CATEGORICAL for g in group_by) or len(set(group_by)) != len(group_by):
+        return JsonResponse({'error': f'group_by must be distinct names from {list(columnar.CATEGORICAL)}'}, status=400)
+
+    min_group_size = columnar.snapshot_config()['MIN_GROUP_SIZE']
+    results = columnar.get_snapshot().query(filters, group_by, min_group_size=min_group_size)
+    return JsonResponse({'group_by': group_by, 'results': results})
+
+def _home_counts(alias):
+    items = ITEM.objects.using(alias)
+    return (
+        items.values_list('school_name', flat=True).distinct().count(),
+        items.count(),
+    )
+
+
 # Create your views here.
-def home(request):
-    # Get statistics for the homepage
-    total_professors = ITEM.objects.values_list('professor_name', flat=True).distinct().count()
-    total_schools = ITEM.objects.values_list('school_name', flat=True).distinct().count()
-    total_reviews = ITEM.objects.count()
-    
+async def home(request):
     # search functionality
     if request.method == 'POST':
         search_query = request.POST.get('search', '').strip()
         if search_query:
-            # Search for professors by name
-            matching_professors = ITEM.objects.filter(
-                professor_name__icontains=search_query
-            ).values_list('professor_name', flat=True).distinct()
+            # Search for professors by name (on every shard)
+            matching_professors = await sharding.adistinct_values(
+                'professor_name', professor_name__icontains=search_query
+            )
             
-            if matching_professors.exists():
-                # If find exact matches, redirect to the first professor's profile
-                first_professor = matching_professors.first()
+            # If find exact matches, redirect to the first professor's profile
+            first_professor = matching_professors[0] if matching_professors else None
+            if first_professor is not None:
                 return redirect('professor_profile', professor_name=first_professor)
             else:
                 # If no exact matches, redirect to browse page with search results
                 return redirect('showitems')
+
+    # Get statistics for the homepage: every shard counts its own rows at the
+    # same time. Schools don't span shards, so their counts add up; a
+    # professor can, so professors are counted on the merged name list.
+    counts, professors = await asyncio.gather(
+        sharding.ascatter(_home_counts),
+        sync_to_async(namecache.professors)(),
+    )
+    total_schools, total_reviews = (sum(column) for column in zip(*counts))
+    total_professors = len(professors)
     
     context = {
         'total_professors': total_professors,
@@ -429,9 +654,9 @@ def home(request):
 
     
 def showitems(request):
-    # Get unique school names and professor names from the database
-    schools = ITEM.objects.values_list('school_name', flat=True).distinct().order_by('school_name')
-    professors = ITEM.objects.values_list('professor_name', flat=True).distinct().order_by('professor_name')
+    # Get unique school names and professor names (cached per worker)
+    schools = namecache.schools()
+    professors = namecache.professors()
     
     selected_school = None
     selected_professor = None
@@ -444,13 +669,17 @@ def showitems(request):
         
         # Filter prof by selected school
         if selected_school:
-            filtered_professors = ITEM.objects.filter(school_name=selected_school).values_list('professor_name', flat=True).distinct().order_by('professor_name')
+            filtered_professors = namecache.professors_at(selected_school)
         
         # Get prof details if professor is selected
         if selected_professor:
-            professor_details = ITEM.objects.filter(professor_name=selected_professor)
+            details = ITEM.objects.filter(professor_name=selected_professor)
             if selected_school:
-                professor_details = professor_details.filter(school_name=selected_school)
+                details = details.filter(school_name=selected_school)
+            professor_details = [
+                review for alias in sharding.shards_for_professor(selected_professor)
+                for review in details.using(alias)
+            ]
     
     context = {
         'schools': schools,
@@ -462,87 +691,150 @@ def showitems(request):
     
     return render(request, 'show.html', context)
 
-def professor_dropdown(request):
-    # Get unique prof names for dropdown
-    professors = ITEM.objects.values_list('professor_name', flat=True).distinct().order_by('professor_name')
+async def professor_dropdown(request):
+    # Get unique prof names for dropdown (cached per worker)
+    professors = await sync_to_async(namecache.professors)()
     return render(request, 'professor_dropdown.html', {"professors": professors})
 
-def professor_profile(request, professor_name):
-    # Get all reviews for the specific prof
-    reviews = ITEM.objects.filter(professor_name=professor_name)
+async def professor_profile(request, professor_name):
+    # Get all reviews for the specific prof (from the shards holding them)
+    aliases = await sharding.ashards_for_professor(professor_name)
+    shard_reviews = [ITEM.objects.using(alias).filter(professor_name=professor_name) for alias in aliases]
+    page_size = getattr(settings, 'REVIEWS_PAGE_SIZE', 20)
+
+    # Only the first page of reviews is rendered (the rest is loaded through
+    # professor_reviews_api); the statistics and histogram bucket counts come
+    # from one aggregate query per shard, so the page cost doesn't grow with
+    # the number of reviews. They are awaited together, but the async ORM
+    # still runs them one after another on its single sync thread.
+    shard_pages, shard_stats, counter = await asyncio.gather(
+        asyncio.gather(*(_alist(reviews.order_by('id')[:page_size + 1]) for reviews in shard_reviews)),
+        asyncio.gather(*(
+            reviews.aaggregate(**dp.stats_annotations(), **dp.histogram_annotations())
+            for reviews in shard_reviews
+        )),
+        TakeAgainCounter.objects.filter(professor_name=professor_name).afirst(),
+    )
+    # A professor split over shards: merge the pages, add up the counts
+    first_page = list(heapq.merge(*shard_pages, key=lambda review: review.id))[:page_size + 1]
+    stats = dp.sum_aggregates(shard_stats)
+    # Noisy rating / difficulty / helpfulness distributions (one noise draw)
+    histograms = dp.histogram_release(dp.histogram_row_counts(stats))
     
-    if not reviews.exists():
+    if not first_page:
         return render(request, 'professor_profile.html', {
             'professor_name': professor_name,
             'error': 'Professor not found'
         })
     
     # Get professor statistics
-    total_reviews = reviews.count()
+    total_reviews = stats['n']
     #average_rating = round(reviews.aggregate(avg_rating=models.Avg('star_rating'))['avg_rating'] or 0, 1)
+
+    if getattr(settings, 'DP_MEAN_FROM_HISTOGRAM', False):
+        # Derive the means from the noisy histograms instead of separate releases
+        average_rating = round(histograms['rating']['mean'], 1)
+        average_difficulty = round(histograms['difficulty']['mean'], 1)
+        average_help_useful = round(histograms['helpful']['mean'], 1)
+    else:
+        # Calculate differentially private average rating
+        min_rating = 0.0
+        max_rating = 5.0
+        epsilon = 1.0  # Privacy loss
+        noisy_avg, true_avg = dp.dp_mean_from_sum(stats['rating_sum'], total_reviews, min_rating, max_rating, epsilon)
+        average_rating = round(noisy_avg, 1)
     
-    # Calculate differentially private average rating
-    ratings = list(reviews.values_list('star_rating', flat=True))
-    min_rating = 0.0
-    max_rating = 5.0
-    epsilon = 1.0  # Privacy loss
-    noisy_avg, true_avg = dp_average(ratings, min_rating, max_rating, epsilon)
-    average_rating = round(noisy_avg, 1)
-    
-    #average_difficulty = round(reviews.aggregate(avg_diff=models.Avg('difficulty'))['avg_diff'] or 0, 1)
-    # Calculate differentially private average difficulty
-    difficulty = list(reviews.values_list('difficulty', flat=True))
-    min_difficulty = 1.0
-    max_difficulty = 5.0
-    epsilon = 1.0 
-    noisy_avg, true_avg = dp_difficulty_average(difficulty, min_difficulty, max_difficulty, epsilon)
-    average_difficulty = round(noisy_avg, 1)
-
-    # average help_useful
-    # Using proper Django aggregate syntax
-    # avg_result = reviews.aggregate(avg_help=models.Avg('help_useful'))
-    # average_help_useful = round(avg_result.get('avg_help') or 0, 1)
-    helpful = list(reviews.values_list('help_useful', flat=True))
-    min_helpful = 1.0
-    max_helpful = 10.0
-    epsilon = 1.0  
-    noisy_avg, true_avg = dp_helpful_average(helpful, min_helpful, max_helpful, epsilon)
-    average_help_useful = round(noisy_avg, 1)
+        #average_difficulty = round(reviews.aggregate(avg_diff=models.Avg('difficulty'))['avg_diff'] or 0, 1)
+        # Calculate differentially private average difficulty
+        min_difficulty = 1.0
+        max_difficulty = 5.0
+        epsilon = 1.0 
+        noisy_avg, true_avg = dp.dp_mean_from_sum(stats['difficulty_sum'], total_reviews, min_difficulty, max_difficulty, epsilon)
+        average_difficulty = round(noisy_avg, 1)
+
+        # average help_useful
+        # Using proper Django aggregate syntax
+        # avg_result = reviews.aggregate(avg_help=models.Avg('help_useful'))
+        # average_help_useful = round(avg_result.get('avg_help') or 0, 1)
+        min_helpful = 1.0
+        max_helpful = 10.0
+        epsilon = 1.0  
+        # Clamp to keep value within valid bounds, like dp_helpful_average
+        noisy_avg, true_avg = dp.dp_mean_from_sum(stats['helpful_sum'], total_reviews, min_helpful, max_helpful, epsilon, clamp=True)
+        average_help_useful = round(noisy_avg, 1)
     
     # percentage who would take again
     # would_take_again_count = reviews.filter(would_take_agains=True).count()
     # would_take_again_percent = round((would_take_again_count / total_reviews) * 100) if total_reviews > 0 else 0
     
-    # Calculate differentially private percentage who would take again
-    true_count = reviews.filter(would_take_agains=True).count()
-    epsilon = 0.1
-    noisy_count = dp_count(true_count, epsilon)
-    # Ensure noisy_count is non-negative
-    noisy_count = max(0, noisy_count)
-    # noisy percentage
-    would_take_again_percent = round((noisy_count / total_reviews) * 100) if total_reviews > 0 else 0
-    # Ensure percentage is between 0 and 100
-    would_take_again_percent = max(0, min(100, would_take_again_percent))
+    if counter is not None:
+        # Continual-release count kept up to date by the write path (no new noise per request)
+        would_take_again_percent = continual.take_again_percent(continual.noisy_count(counter), total_reviews)
+    else:
+        # Calculate differentially private percentage who would take again
+        true_count = stats['take_again']
+        epsilon = 0.1
+        noisy_count = dp_count(true_count, epsilon)
+        # Ensure noisy_count is non-negative
+        noisy_count = max(0, noisy_count)
+        # noisy percentage
+        would_take_again_percent = round((noisy_count / total_reviews) * 100) if total_reviews > 0 else 0
+        # Ensure percentage is between 0 and 100
+        would_take_again_percent = max(0, min(100, would_take_again_percent))
     
     # Get school name (assuming all reviews are from the same school)
-    school_name = reviews.first().school_name
-    department_name = reviews.first().department_name
+    school_name = first_page[0].school_name
+    department_name = first_page[0].department_name
+
+    # Keyset cursor for the next page (None when everything is shown)
+    has_more = len(first_page) > page_size
+    first_page = first_page[:page_size]
     
     context = {
         'professor_name': professor_name,
         'school_name': school_name,
         'department_name':department_name,
-        'reviews': reviews,
+        'reviews': first_page,
+        'next_cursor': first_page[-1].id if has_more else None,
         'total_reviews': total_reviews,
         'average_rating': average_rating,
         'average_difficulty': average_difficulty,
         'average_help_useful': average_help_useful,
         'would_take_again_percent': would_take_again_percent,
+        'histograms': histograms,
     }
     
     return render(request, 'professor_profile.html', context)
 
-def search_prof(request):
+async def professor_reviews_api(request, professor_name):
+    """Next page of a professor's reviews after the ?after=<id> cursor, as JSON."""
+    page_size = getattr(settings, 'REVIEWS_PAGE_SIZE', 20)
+    try:
+        after = int(request.GET.get('after', 0))
+        limit = max(1, min(100, int(request.GET.get('limit', page_size))))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    # Keyset pagination: uses the partial (professor_name, id) index over live
+    # reviews, so the cost of a page doesn't depend on how far into the list it is
+    aliases = await sharding.ashards_for_professor(professor_name)
+    shard_rows = await asyncio.gather(*(
+        _alist(
+            ITEM.objects.using(alias).filter(professor_name=professor_name, id__gt=after)
+            .order_by('id')
+            .values('id', 'course', 'comments')[:limit + 1]
+        )
+        for alias in aliases
+    ))
+    rows = list(heapq.merge(*shard_rows, key=lambda row: row['id']))[:limit + 1]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return JsonResponse({
+        'reviews': rows,
+        'next_cursor': rows[-1]['id'] if has_more else None,
+    })
+
+async def search_prof(request):
     search_query = request.GET.get('q', '').strip()
     professor_results = []
     debug_info = []
@@ -552,7 +844,7 @@ def search_prof(request):
         debug_info.append(f"Searching for: '{search_query}'")
         
         # Debug: Show sample professor names from database
-        sample_professors = ITEM.objects.values_list('professor_name', flat=True).distinct()[:3]
+        sample_professors = (await sync_to_async(namecache.professors)())[:3]
         debug_info.append(f"Sample names in DB: {list(sample_professors)}")
         
         # Check if it's a full name (contains space) or partial name
@@ -560,124 +852,88 @@ def search_prof(request):
             debug_info.append("Full name search detected")
             
             # Try multiple search approaches for full names
+            # (each lookup runs on every shard and merges the sorted names)
             # 1. Exact match
-            professors = ITEM.objects.filter(
-                professor_name__iexact=search_query
-            ).values_list('professor_name', flat=True).distinct().order_by('professor_name')
-            debug_info.append(f"Exact match results: {list(professors)}")
+            professors = await sharding.adistinct_values('professor_name', professor_name__iexact=search_query)
+            debug_info.append(f"Exact match results: {professors}")
             
             # 2. If no exact match, try with normalized spacing
-            if not professors.exists():
+            if not professors:
                 # Normalize the search query (remove extra spaces)
                 normalized_query = ' '.join(search_query.split())
                 debug_info.append(f"Trying normalized query: '{normalized_query}'")
-                professors = ITEM.objects.filter(
-                    professor_name__iexact=normalized_query
-                ).values_list('professor_name', flat=True).distinct().order_by('professor_name')
-                debug_info.append(f"Normalized exact match results: {list(professors)}")
+                professors = await sharding.adistinct_values('professor_name', professor_name__iexact=normalized_query)
+                debug_info.append(f"Normalized exact match results: {professors}")
             
             # 3. If still no match, try searching with double space (common issue)
-            if not professors.exists():
+            if not professors:
                 debug_info.append("Trying with double space")
                 double_space_query = search_query.replace(' ', '  ')
-                professors = ITEM.objects.filter(
-                    professor_name__iexact=double_space_query
-                ).values_list('professor_name', flat=True).distinct().order_by('professor_name')
-                debug_info.append(f"Double space search results: {list(professors)}")
+                professors = await sharding.adistinct_values('professor_name', professor_name__iexact=double_space_query)
+                debug_info.append(f"Double space search results: {professors}")
             
             # 4. If still no match, try partial match
-            if not professors.exists():
+            if not professors:
                 debug_info.append("No exact match, trying partial match")
-                professors = ITEM.objects.filter(
-                    professor_name__icontains=search_query
-                ).values_list('professor_name', flat=True).distinct().order_by('professor_name')
-                debug_info.append(f"Partial match results: {list(professors)}")
+                professors = await sharding.adistinct_values('professor_name', professor_name__icontains=search_query)
+                debug_info.append(f"Partial match results: {professors}")
             
             # 5. If still no match, try searching for each part separately
-            if not professors.exists():
+            if not professors:
                 debug_info.append("Trying individual name parts")
                 first_name, last_name = search_query.split(' ', 1)
-                professors = ITEM.objects.filter(
-                    professor_name__icontains=first_name
-                ).filter(
-                    professor_name__icontains=last_name
-                ).values_list('professor_name', flat=True).distinct().order_by('professor_name')
-                debug_info.append(f"Individual parts search results: {list(professors)}")
+                professors = await sharding.adistinct_values(
+                    'professor_name',
+                    models.Q(professor_name__icontains=first_name),
+                    models.Q(professor_name__icontains=last_name),
+                )
+                debug_info.append(f"Individual parts search results: {professors}")
         else:
             debug_info.append("Partial name search detected")
             # Partial name search - find all professors containing this name
-            professors = ITEM.objects.filter(
-                professor_name__icontains=search_query
-            ).values_list('professor_name', flat=True).distinct().order_by('professor_name')
-            debug_info.append(f"Partial search results: {list(professors)}")
+            professors = await sharding.adistinct_values('professor_name', professor_name__icontains=search_query)
+            debug_info.append(f"Partial search results: {professors}")
         
         # If we find exactly one professor, redirect directly to their profile
-        if professors.count() == 1:
-            return redirect('professor_profile', professor_name=professors.first())
+        professor_names = professors
+        if len(professor_names) == 1:
+            return redirect('professor_profile', professor_name=professor_names[0])
         
-        # Get detailed information for multiple professors
-        for professor_name in professors:
-            reviews = ITEM.objects.filter(professor_name=professor_name)
-            if reviews.exists():
-                # Get professor statistics
-                total_reviews = reviews.count()
-                #average_rating = round(reviews.aggregate(avg_rating=models.Avg('star_rating'))['avg_rating'] or 0, 1)
-                
-                # Calculate differentially private average rating
-                ratings = list(reviews.values_list('star_rating', flat=True))
-                min_rating = 0.0
-                max_rating = 5.0
-                epsilon = 1.0  # Privacy budget
-                noisy_avg, true_avg = dp_average(ratings, min_rating, max_rating, epsilon)
-                average_rating = round(noisy_avg, 1)
-                
-                #average_difficulty = round(reviews.aggregate(avg_diff=models.Avg('difficulty'))['avg_diff'] or 0, 1)
-                # Calculate differentially private average difficulty
-                difficulty = list(reviews.values_list('difficulty', flat=True))
-                min_difficulty = 1.0
-                max_difficulty = 5.0
-                epsilon = 1.0  # Privacy budget
-                noisy_avg, true_avg = dp_difficulty_average(difficulty, min_difficulty, max_difficulty, epsilon)
-                average_difficulty = round(noisy_avg, 1)
-
-                # Calculate average help_useful
-                # Using proper Django aggregate syntax
-                # avg_result = reviews.aggregate(avg_help=models.Avg('help_useful'))
-                # average_help_useful = round(avg_result.get('avg_help') or 0, 1)
-                helpful = list(reviews.values_list('help_useful', flat=True))
-                min_helpful = 1.0
-                max_helpful = 10.0
-                epsilon = 1.0  # Privacy loss
-                noisy_avg, true_avg = dp_helpful_average(helpful, min_helpful, max_helpful, epsilon)
-                average_help_useful = round(noisy_avg, 1)
-                
-                # Calculate percentage who would take again
-                # would_take_again_count = reviews.filter(would_take_agains=True).count()
-                # would_take_again_percent = round((would_take_again_count / total_reviews) * 100) if total_reviews > 0 else 0
-                # Calculate differentially private percentage who would take again
-                true_count = reviews.filter(would_take_agains=True).count()
-                epsilon = 0.1  # Privacy budget
-                noisy_count = dp_count(true_count, epsilon)
-                # Ensure noisy_count is non-negative
-                noisy_count = max(0, noisy_count)
-                # Calculate noisy percentage
-                would_take_again_percent = round((noisy_count / total_reviews) * 100) if total_reviews > 0 else 0
-                # Ensure percentage is between 0 and 100
-                would_take_again_percent = max(0, min(100, would_take_again_percent))
-                
-                # Get school name
-                school_name = reviews.first().school_name
-                
-                professor_results.append({
-                    'name': professor_name,
-                    'school_name': school_name,
-                    'total_reviews': total_reviews,
-                    'average_rating': average_rating,
-                    'average_difficulty': average_difficulty,
-                    'average_help_useful': average_help_useful,
-                    'would_take_again_percent': would_take_again_percent,
-                    'reviews': reviews[:3]  # Show first 3 reviews as preview
-                })
+        # Get detailed information for multiple professors: every shard runs
+        # one grouped statistics query and one preview query for its matches,
+        # and the merged rows get one batched noise draw
+        def load_matches(alias):
+            matches = ITEM.objects.using(alias).filter(professor_name__in=professor_names)
+            return (
+                list(dp.professor_rows(matches)),
+                # First 3 reviews of every professor as preview, in one windowed query
+                list(
+                    matches.annotate(
+                        preview_rank=Window(RowNumber(), partition_by=[F('professor_name')], order_by=F('id').asc())
+                    ).filter(preview_rank__lte=3).order_by('professor_name', 'id')
+                ),
+            )
+
+        shard_results, counters = await asyncio.gather(
+            sharding.ascatter(load_matches),
+            _alist(TakeAgainCounter.objects.filter(professor_name__in=professor_names)),
+        )
+        by_name = itemgetter('professor_name')
+        stats_rows = list(dp.combine_rows(heapq.merge(*(rows for rows, _ in shard_results), key=by_name), by_name))
+        previews = [review for _, shard_previews in shard_results for review in shard_previews]
+        counter_by_name = {counter.professor_name: counter for counter in counters}
+        preview_by_name = {}
+        for review in previews:
+            preview = preview_by_name.setdefault(review.professor_name, [])
+            if len(preview) < 3:
+                preview.append(review)
+        for row in dp.release_rows(stats_rows):
+            row['reviews'] = preview_by_name.get(row['name'], [])
+            counter = counter_by_name.get(row['name'])
+            if counter is not None:
+                row['would_take_again_percent'] = continual.take_again_percent(
+                    continual.noisy_count(counter), row['total_reviews'])
+            professor_results.append(row)
     
     context = {
         'search_query': search_query,
@@ -689,53 +945,237 @@ def search_prof(request):
     return render(request, 'search_prof.html', context)
 
 
+def school_overview(request):
+    # DP aggregates for every school (cached until the data changes)
+    release = aggregates.school_release()
+    return render(request, 'school_stats.html', {'schools': release['schools']})
+
+def school_departments(request, school_name):
+    # DP aggregates for every department of one school, consistent with the school totals
+    release = aggregates.school_release()
+    school = next((row for row in release['schools'] if row['school_name'] == school_name), None)
+    if school is None:
+        return render(request, 'school_departments.html', {
+            'school_name': school_name,
+            'error': 'School not found'
+        })
+    context = {
+        'school_name': school_name,
+        'school': school,
+        'departments': release['departments'].get(school_name, []),
+    }
+    return render(request, 'school_departments.html', context)
+
+
+def parse_review_fields(data):
+    """
+    Validate and coerce review fields from the write-review form (or a dict
+    with the same keys). Returns (fields, missing_fields).
+    """
+    def raw(key):
+        value = data.get(key, '')
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        return str(value if value is not None else '').strip()
+
+    course = raw('course')
+    difficulty_raw = raw('difficulty')
+    help_useful_raw = raw('help_useful')
+    rating_raw = raw('rating')
+    would_take_raw = raw('would_take_agains')
+    comments = raw('message')
+
+    # Basic validation and type coercion
+    try:
+        difficulty = int(difficulty_raw) if difficulty_raw else None
+    except ValueError:
+        difficulty = None
+    try:
+        help_useful = int(help_useful_raw) if help_useful_raw else None
+    except ValueError:
+        help_useful = None
+    if help_useful is not None:
+        # Clamp to keep within allowed positive range (1-10)
+        help_useful = max(1, min(10, help_useful))
+    try:
+        star_rating = float(rating_raw) if rating_raw else None
+    except ValueError:
+        star_rating = None
+    would_take_agains = True if would_take_raw == 'true' else False if would_take_raw == 'false' else None
+
+    # Minimal required fields check
+    missing_fields = []
+    if not course:
+        missing_fields.append('course')
+    if difficulty is None:
+        missing_fields.append('difficulty')
+    if help_useful is None:
+        missing_fields.append('help_useful')
+    if star_rating is None:
+        missing_fields.append('rating')
+    if would_take_agains is None:
+        missing_fields.append('would_take_agains')
+    if not comments:
+        missing_fields.append('message')
+
+    fields = {
+        'course': course,
+        'difficulty': difficulty,
+        'help_useful': help_useful,
+        'star_rating': star_rating,
+        'would_take_agains': would_take_agains,
+        'comments': comments,
+    }
+    return fields, missing_fields
+
+
+# Maximum reviews per ingest_reviews request
+MAX_INGEST_BATCH = 1000
+
+
+def _ingest_auth_error(request):
+    """
+    None if the request may ingest: it carries the INGEST_API_TOKEN bearer
+    token, or comes from a staff session with a valid CSRF token. Otherwise
+    the error response.
+    """
+    token = getattr(settings, 'INGEST_API_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(header[7:].encode(), token.encode()):
+        return None
+    user = getattr(request, 'user', None)
+    if user is None or not (user.is_active and user.is_staff):
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    # The view is csrf_exempt for token clients; sessions still need the check
+    rejected = CsrfViewMiddleware(lambda r: None).process_view(request, None, (), {})
+    if rejected is not None:
+        return JsonResponse({'error': 'CSRF verification failed'}, status=403)
+    return None
+
+
+@csrf_exempt
+def ingest_reviews(request):
+    """
+    Create many reviews from one JSON request: {"reviews": [{...}, ...]}.
+
+    Requires the INGEST_API_TOKEN bearer token or a staff session. Each
+    review uses the write-review form keys plus professor_name (and
+    optionally school_name / department_name for new professors). Fields are
+    validated like WriteReview, comments are regex-scrubbed and cut to the
+    column length, and all valid reviews are inserted with one bulk_create.
+    Every review is queued for LLM anonymization (anonymize_reviews command).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    auth_error = _ingest_auth_error(request)
+    if auth_error is not None:
+        return auth_error
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid request data'}, status=400)
+    items = data.get('reviews') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return JsonResponse({'error': 'Provide a non-empty "reviews" list'}, status=400)
+    if len(items) > MAX_INGEST_BATCH:
+        return JsonResponse({'error': f'At most {MAX_INGEST_BATCH} reviews per request'}, status=400)
+
+    names = {
+        ' '.join(str(item.get('professor_name') or '').split())
+        for item in items if isinstance(item, dict)
+    }
+    # School and department of every known professor, from their first review
+    # (one query per shard)
+    def first_reviews(alias):
+        items = ITEM.objects.using(alias)
+        first_ids = (
+            items.filter(professor_name__in=names)
+            .values('professor_name').annotate(first_id=models.Min('id')).values('first_id')
+        )
+        return list(items.filter(id__in=first_ids).values('professor_name', 'school_name', 'department_name'))
+
+    known = {row['professor_name']: row for rows in sharding.scatter(first_reviews) for row in rows}
+
+    results = [None] * len(items)
+    pending = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'index': index, 'status': 'error', 'error': 'Review must be an object'}
+            continue
+        professor_name = ' '.join(str(item.get('professor_name') or '').split())
+        fields, missing_fields = parse_review_fields(item)
+        if not professor_name:
+            missing_fields.insert(0, 'professor_name')
+        if missing_fields:
+            results[index] = {'index': index, 'status': 'error', 'missing_fields': missing_fields}
+            continue
+        professor = known.get(professor_name, {})
+        school_name = professor.get('school_name') or str(item.get('school_name') or '').strip() or 'Unknown'
+        department_name = (professor.get('department_name')
+                           or str(item.get('department_name') or '').strip() or 'Unknown')
+        pending.append((index, ITEM(
+            professor_name=professor_name,
+            school_name=school_name,
+            department_name=department_name,
+            star_rating=fields['star_rating'],
+            course=fields['course'],
+            difficulty=fields['difficulty'],
+            would_take_agains=fields['would_take_agains'],
+            help_useful=fields['help_useful'],
+            comments=fields['comments'],
+        )))
+
+    # Regex-scrub the whole batch and queue every review for LLM
+    # anonymization; clients can't vouch for their own text
+    comments_length = ITEM._meta.get_field('comments').max_length
+    for index, review in pending:
+        has_personal_info, cleaned = detect_and_remove_personal_info(review.comments)
+        review.comments = cleaned[:comments_length]
+        review.needs_anonymization = True
+
+    if pending:
+        try:
+            by_shard = {}
+            for _, review in pending:
+                by_shard.setdefault(sharding.shard_for_school(review.school_name), []).append(review)
+            with transaction.atomic():
+                for alias, reviews in by_shard.items():
+                    with transaction.atomic(using=alias):
+                        ITEM.objects.using(alias).bulk_create(reviews)
+                events = {}
+                for _, review in pending:
+                    events.setdefault(review.professor_name, []).append(1.0 if review.would_take_agains else 0.0)
+                for name, professor_events in events.items():
+                    continual.record(name, professor_events)
+        except Exception as e:
+            return JsonResponse({'error': f'Error saving reviews: {str(e)}'}, status=500)
+        bump_data_version()
+        for index, review in pending:
+            results[index] = {'index': index, 'status': 'created', 'id': review.pk}
+
+    return JsonResponse({'created': len(pending), 'results': results})
+
+
 def WriteReview(request,professor_name):
     # Render the write-review page for a specific professor and handle submission
-    professor = ITEM.objects.filter(professor_name=professor_name).first()
+    # The professor's first review, on whichever shard holds it
+    professor = min(
+        (review for alias in sharding.shards_for_professor(professor_name)
+         for review in ITEM.objects.using(alias).filter(professor_name=professor_name).order_by('id')[:1]),
+        key=lambda review: review.id, default=None,
+    )
     school_name = professor.school_name if professor else ''
     department_name = professor.department_name if professor else ''
 
     if request.method == 'POST':
-        # Extract form values
-        course = request.POST.get('course', '').strip()
-        difficulty_raw = request.POST.get('difficulty', '').strip()
-        help_useful_raw = request.POST.get('help_useful', '').strip()
-        rating_raw = request.POST.get('rating', '').strip()
-        would_take_raw = request.POST.get('would_take_agains', '').strip()
-        comments = request.POST.get('message', '').strip()
-
-        # Basic validation and type coercion
-        try:
-            difficulty = int(difficulty_raw) if difficulty_raw else None
-        except ValueError:
-            difficulty = None
-        try:
-            help_useful = int(help_useful_raw) if help_useful_raw else None
-        except ValueError:
-            help_useful = None
-        if help_useful is not None:
-            # Clamp to keep within allowed positive range (1-10)
-            help_useful = max(1, min(10, help_useful))
-        try:
-            star_rating = float(rating_raw) if rating_raw else None
-        except ValueError:
-            star_rating = None
-        would_take_agains = True if would_take_raw == 'true' else False if would_take_raw == 'false' else None
-
-        # Minimal required fields check
-        missing_fields = []
-        if not course:
-            missing_fields.append('course')
-        if difficulty is None:
-            missing_fields.append('difficulty')
-        if help_useful is None:
-            missing_fields.append('help_useful')
-        if star_rating is None:
-            missing_fields.append('rating')
-        if would_take_agains is None:
-            missing_fields.append('would_take_agains')
-        if not comments:
-            missing_fields.append('message')
+        # Extract and validate form values
+        fields, missing_fields = parse_review_fields(request.POST)
+        course = fields['course']
+        difficulty = fields['difficulty']
+        help_useful = fields['help_useful']
+        star_rating = fields['star_rating']
+        would_take_agains = fields['would_take_agains']
+        comments = fields['comments']
 
         if missing_fields:
             messages.error(request, f"Please fill all required fields: {', '.join(missing_fields)}")
@@ -758,32 +1198,28 @@ def WriteReview(request,professor_name):
             if not department_name:
                 department_name = 'Unknown'
 
-            # Create a new ITEM review entry
+            # Create a new ITEM review entry (committed together with other
+            # concurrent submissions by the group-commit writer)
             try:
-                ITEM.objects.create(
-                    professor_name=professor_name,
-                    school_name=school_name,
-                    department_name=department_name,
-                    star_rating=star_rating,
-                    course=course,
-                    difficulty=difficulty,
-                    would_take_agains=would_take_agains if would_take_agains is not None else False,
-                    help_useful=help_useful if help_useful is not None else 0,
-                    comments=cleaned_comments,
-                )
+                writer.create_review({
+                    'professor_name': professor_name,
+                    'school_name': school_name,
+                    'department_name': department_name,
+                    'star_rating': star_rating,
+                    'course': course,
+                    'difficulty': difficulty,
+                    'would_take_agains': would_take_agains if would_take_agains is not None else False,
+                    'help_useful': help_useful if help_useful is not None else 0,
+                    'comments': cleaned_comments,
+                })
                 messages.success(request, 'Your review has been submitted.')
                 return redirect('professor_profile', professor_name=professor_name)
             except Exception as e:
                 messages.error(request, f'Error saving review: {str(e)}')
                 # Don't redirect, stay on the form so user can see the error
 
-    # Build unique course list for this professor
-    courses = list(
-        ITEM.objects.filter(professor_name=professor_name)
-        .values_list('course', flat=True)
-        .distinct()
-        .order_by('course')
-    )
+    # Build unique course list for this professor (cached per worker)
+    courses = list(namecache.courses_of(professor_name))
     context = {
         'professor_name': professor_name,
         'school_name': school_name,
@@ -796,21 +1232,99 @@ def WriteReviewBlank(request):
     # If a query is provided and looks like a full name, try to redirect directly
     search_query = request.GET.get('q', '').strip()
     if search_query and ' ' in search_query:
-        professors = ITEM.objects.filter(
-            professor_name__iexact=search_query
-        ).values_list('professor_name', flat=True).distinct().order_by('professor_name')
-        if professors.count() == 1:
-            return redirect('WriteReview', professor_name=professors.first())
+        professors = sharding.distinct_values('professor_name', professor_name__iexact=search_query)
+        if len(professors) == 1:
+            return redirect('WriteReview', professor_name=professors[0])
     # Fallback to home if no direct match
     return render(request,'home.html')
 
+MODERATION_FILTERS = ('professor', 'school', 'pattern')
+
+
+def _moderation_criteria(params):
+    """models.Q for the Databaseshow match form, or None if no field is filled in."""
+    values = {name: params.get(name, '').strip() for name in MODERATION_FILTERS}
+    if not any(values.values()):
+        return None
+    criteria = models.Q()
+    if values['professor']:
+        criteria &= models.Q(professor_name=values['professor'])
+    if values['school']:
+        criteria &= models.Q(school_name=values['school'])
+    if values['pattern']:
+        criteria &= models.Q(comments__icontains=values['pattern'])
+    return criteria
+
+
+def _databaseshow_url(params, **extra):
+    """Databaseshow URL keeping the match form's fields."""
+    query = urlencode({**{name: params[name] for name in MODERATION_FILTERS if params.get(name)}, **extra})
+    return reverse('Databaseshow') + (f'?{query}' if query else '')
+
+
+@staff_member_required
 def Databaseshow(request):
-    items = ITEM.objects.all().order_by('-id')
-    return render(request,'databaseshow.html', { 'items': items })
+    page_size = getattr(settings, 'MODERATION_PAGE_SIZE', 50)
+    try:
+        before = int(request.GET.get('before', 0)) or None
+    except ValueError:
+        before = None
+    criteria = _moderation_criteria(request.GET)
+
+    # Keyset pagination: one page per shard below the ?before=<id> cursor,
+    # read backwards in id order and merged newest first
+    def page(alias):
+        queryset = ITEM.objects.using(alias).filter(criteria or models.Q())
+        if before is not None:
+            queryset = queryset.filter(id__lt=before)
+        return list(queryset.order_by('-id')[:page_size + 1])
+
+    items = list(itertools.islice(
+        heapq.merge(*sharding.scatter(page), key=lambda item: item.id, reverse=True),
+        page_size + 1,
+    ))
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    matching = None
+    if criteria is not None:
+        matching = sum(sharding.scatter(lambda alias: ITEM.objects.using(alias).filter(criteria).count()))
+    filters = {name: request.GET.get(name, '').strip() for name in MODERATION_FILTERS}
+    return render(request,'databaseshow.html', {
+        'items': items,
+        'filters': filters,
+        'matching': matching,
+        'next_url': _databaseshow_url(filters, before=items[-1].id) if has_more else None,
+    })
 
+@staff_member_required
 def delete_review(request, review_id):
     if request.method == 'POST':
-        ITEM.objects.filter(id=review_id).delete()
+        writer.delete_review(review_id)
         messages.success(request, 'Review deleted.')
     return redirect('Databaseshow')
+
+
+@staff_member_required
+def moderate_reviews(request):
+    """
+    Bulk moderation from Databaseshow: delete the checked reviews, or every
+    review matching the professor / school / comment pattern form. Rows get a
+    tombstone in one UPDATE per shard; purge_tombstones removes them later.
+    """
+    if request.method != 'POST':
+        return redirect('Databaseshow')
+    action = request.POST.get('action')
+    criteria = None
+    if action == 'delete_selected':
+        ids = [int(value) for value in request.POST.getlist('review_ids') if value.isdigit()]
+        if ids:
+            criteria = models.Q(id__in=ids)
+    elif action == 'delete_matching':
+        criteria = _moderation_criteria(request.POST)
+    if criteria is None:
+        messages.error(request, 'No reviews selected.')
+    else:
+        deleted = writer.tombstone_reviews(criteria)
+        messages.success(request, f'Deleted {deleted} review{"" if deleted == 1 else "s"}.')
+    return redirect(_databaseshow_url(request.POST))
     
\ No newline at end of file
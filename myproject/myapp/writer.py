@@ -0,0 +1,214 @@
+"""
+Group-commit writer for review inserts and deletes.
+
+SQLite has one writer at a time, and every commit waits for its own fsync.
+Under a burst of submissions, request threads therefore queue up on the
+write lock one transaction at a time. Instead, request threads hand their
+write to a single writer thread per process and wait. The writer collects
+writes for up to MAX_WAIT_MS (or MAX_BATCH writes), applies them in one
+transaction with a savepoint each, commits once, and then wakes every
+waiting request with its own result or exception. A request returns only
+after its write is committed, so no acknowledged write can be lost.
+
+The write runs synchronously in the calling thread when the writer is
+disabled, or when the caller is already inside a transaction that the write
+has to be part of.
+
+Deleting a review only sets its is_deleted tombstone; the purge_tombstones
+command removes the rows later. tombstone_reviews() does the same for every
+review matching a filter (bulk moderation), with one UPDATE per shard, as
+a single write in the writer's queue.
+"""
+import queue
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import close_old_connections, connections, models, transaction
+
+from . import sharding
+from .lazy import lazy_import
+from .models import ITEM
+from .versioning import bump_data_version
+
+continual = lazy_import('myapp.continual')
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_BATCH': 64,        # writes per transaction
+    'MAX_WAIT_MS': 5,       # how long the first write of a batch waits for company
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, 'REVIEW_WRITER', {})}
+
+
+def _insert(fields):
+    """Create a review on its school's shard and count it; returns the review."""
+    alias = sharding.shard_for_school(fields['school_name'])
+    with transaction.atomic(using=alias), transaction.atomic():
+        review = ITEM.objects.using(alias).create(**fields)
+        continual.record(review.professor_name, [1.0 if review.would_take_agains else 0.0])
+    return review
+
+
+def _delete(review_id):
+    """Tombstone a review and count the deletion; returns False if it didn't exist."""
+    alias = sharding.shard_for_id(review_id)
+    with transaction.atomic(using=alias), transaction.atomic():
+        review = ITEM.objects.using(alias).filter(id=review_id).values('professor_name', 'would_take_agains').first()
+        if review is None:
+            return False
+        ITEM.objects.using(alias).filter(id=review_id).update(is_deleted=True)
+        continual.record(review['professor_name'], [-1.0 if review['would_take_agains'] else 0.0])
+    return True
+
+
+def _tombstone(criteria):
+    """Tombstone the live reviews matching a Q on every shard and count the deletions."""
+    deleted = 0
+    for alias in sharding.shards():
+        with transaction.atomic(using=alias), transaction.atomic():
+            matching = ITEM.objects.using(alias).filter(criteria)
+            # Deletions per professor for the counters, read before the UPDATE
+            per_professor = list(
+                matching.order_by().values('professor_name').annotate(
+                    total=models.Count('id'),
+                    take_again=models.Count('id', filter=models.Q(would_take_agains=True)),
+                )
+            )
+            if not per_professor:
+                continue
+            deleted += matching.update(is_deleted=True)
+            for row in per_professor:
+                events = [-1.0] * row['take_again'] + [0.0] * (row['total'] - row['take_again'])
+                continual.record(row['professor_name'], events)
+    return deleted
+
+
+def _aliases(func, arg):
+    """Database aliases a write touches (its shard(s) plus 'default' for the counters)."""
+    if func is _tombstone:
+        return {alias or 'default' for alias in sharding.shards()} | {'default'}
+    alias = sharding.shard_for_school(arg['school_name']) if func is _insert else sharding.shard_for_id(arg)
+    return {alias or 'default', 'default'}
+
+
+class _Write:
+    __slots__ = ('func', 'arg', 'done', 'result', 'error')
+
+    def __init__(self, func, arg):
+        self.func = func
+        self.arg = arg
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GroupCommitWriter(threading.Thread):
+    """Applies queued writes in batches, one commit per batch."""
+
+    def __init__(self, max_batch, max_wait):
+        super().__init__(name='review-writer', daemon=True)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+
+    def submit(self, func, arg):
+        write = _Write(func, arg)
+        self._queue.put(write)
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            except Exception:
+                # Keep the thread alive for the writes still queued
+                pass
+
+    def _commit(self, batch):
+        try:
+            # Long-lived thread: apply CONN_MAX_AGE / health checks like a request would
+            close_old_connections()
+            aliases = set().union(*(_aliases(write.func, write.arg) for write in batch))
+            with ExitStack() as stack:
+                for alias in sorted(aliases):
+                    stack.enter_context(transaction.atomic(using=alias))
+                # Each write runs in its own savepoint, so one failing write
+                # doesn't roll back the rest of the batch
+                for write in batch:
+                    try:
+                        write.result = write.func(write.arg)
+                    except Exception as e:
+                        write.error = e
+        except Exception as e:
+            # The commit itself failed: nothing in the batch was written
+            for write in batch:
+                write.result, write.error = None, e
+        try:
+            if any(write.error is None for write in batch):
+                bump_data_version()
+        finally:
+            # Wake the requests even if the version bump failed; the writes
+            # are committed either way
+            for write in batch:
+                write.done.set()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer():
+    global _writer
+    if _writer is None or not _writer.is_alive():
+        with _writer_lock:
+            if _writer is None or not _writer.is_alive():
+                config = _config()
+                _writer = GroupCommitWriter(config['MAX_BATCH'], config['MAX_WAIT_MS'] / 1000.0)
+                _writer.start()
+    return _writer
+
+
+def _submit(func, arg):
+    in_transaction = any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+    if not _config()['ENABLED'] or in_transaction:
+        # Synchronous fallback
+        result = func(arg)
+        bump_data_version()
+        return result
+    return _get_writer().submit(func, arg)
+
+
+def create_review(fields):
+    """Insert a review (ITEM field values); returns the saved ITEM once committed."""
+    return _submit(_insert, fields)
+
+
+def delete_review(review_id):
+    """Delete a review by id; returns whether it existed, once committed."""
+    return _submit(_delete, review_id)
+
+
+def tombstone_reviews(criteria):
+    """
+    Delete every live review matching a models.Q, in one UPDATE per shard;
+    returns how many were deleted, once committed.
+    """
+    return _submit(_tombstone, criteria)
@@ -14,6 +14,10 @@ from pathlib import Path
 import os
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "Enter GEMINI_API_KEY here ")
 
+# Bearer token for /api/reviews/ingest/ (staff sessions work without it);
+# empty disables token access
+INGEST_API_TOKEN = os.environ.get("INGEST_API_TOKEN", "")
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,6 +52,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myapp.profiling.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,6 +87,76 @@ DATABASES = {
     }
 }
 
+# Optional partitioning of reviews by school (see myapp/sharding.py): with
+# REVIEW_SHARDS=<n> in the environment, ITEM rows are spread over n SQLite
+# files by a hash of school_name. Create them and move existing reviews with
+# `python manage.py setup_shards --move`. Changing n needs a fresh move.
+REVIEW_SHARDS = []
+for shard in range(int(os.environ.get('REVIEW_SHARDS', '0'))):
+    DATABASES[f'reviews_{shard}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'reviews_{shard}.sqlite3',
+    }
+    REVIEW_SHARDS.append(f'reviews_{shard}')
+
+DATABASE_ROUTERS = ['myapp.sharding.SchoolShardRouter']
+
+# Production database profile (DB_PROFILE=production):
+# - WAL journaling, so readers don't block on the writer (and vice versa)
+# - per-connection pragmas: synchronous=NORMAL (safe with WAL), 256 MB mmap,
+#   64 MB page cache, in-memory temp tables
+# - IMMEDIATE transactions and a 20 s busy timeout instead of
+#   "database is locked" under concurrent writes
+# - persistent connections with health checks (DB_CONN_MAX_AGE seconds; set
+#   it to 0 under ASGI, where Django can't reuse connections across requests)
+# - a read-only 'replica' alias on the same file that serves the read views
+#   (see myapp/routers.py)
+if os.environ.get('DB_PROFILE') == 'production':
+    SQLITE_PRAGMAS = (
+        'PRAGMA synchronous=NORMAL; PRAGMA mmap_size=268435456; '
+        'PRAGMA cache_size=-65536; PRAGMA temp_store=MEMORY;'
+    )
+    DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '600'))
+    for database in DATABASES.values():
+        database['OPTIONS'] = {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; ' + SQLITE_PRAGMAS,
+        }
+        database['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+        database['CONN_HEALTH_CHECKS'] = True
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+        'OPTIONS': {
+            'timeout': 20,
+            'init_command': SQLITE_PRAGMAS + ' PRAGMA query_only=ON;',
+        },
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS.append('myapp.routers.ReadReplicaRouter')
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+# 'default' is per process; 'shared' is seen by every worker process and
+# holds the data-version stamp (see myapp/versioning.py). Point it at
+# Redis/Memcached when the workers don't share a filesystem.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'shared_cache',
+    },
+}
+
+DATA_VERSION_CACHE = 'shared'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -123,3 +198,98 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Derive the profile page averages from the noisy histograms (one DP release)
+# instead of separate dp_average / dp_difficulty_average / dp_helpful_average
+# calls. By default the three means are released on top of the histograms, so
+# a profile view costs epsilon 3 * HISTOGRAM_EPSILON + 3 * AVERAGE_EPSILON +
+# COUNT_EPSILON = 6.1; with DP_MEAN_FROM_HISTOGRAM=1 it costs 3.1, but the
+# means of professors with few reviews are noisier.
+DP_MEAN_FROM_HISTOGRAM = os.environ.get("DP_MEAN_FROM_HISTOGRAM", "0") == "1"
+
+# Reviews rendered on the professor page; further pages load via the JSON API
+REVIEWS_PAGE_SIZE = 20
+
+# Reviews per page on the Databaseshow moderation page
+MODERATION_PAGE_SIZE = 50
+
+# Admission control for /api/check-privacy-risk/ (see myapp/admission.py):
+# per-client token bucket (RATE tokens/s up to BURST, kept per process or,
+# with BACKEND 'cache', in the CACHE alias shared by all workers) and a cap on
+# concurrent Gemini calls per worker process
+PRIVACY_CHECK_ADMISSION = {
+    'RATE': 0.5,
+    'BURST': 10,
+    'BACKEND': 'local',
+    'CACHE': 'shared',
+    'MAX_CONCURRENT': 4,
+}
+
+# Near-duplicate index that reuses earlier Gemini verdicts (see myapp/dedup.py)
+NEAR_DUPLICATE_INDEX = {
+    'DIR': BASE_DIR / 'dedup_index',
+    'THRESHOLD': 0.9,
+    'NUM_PERM': 128,
+    'BANDS': 16,
+    'SHINGLE_SIZE': 5,
+    'MAX_ENTRIES': 100000,
+    'SAVE_EVERY': 20,
+}
+
+# Per-worker cache of distinct school / professor / course lists (see
+# myapp/namecache.py); per-school and per-professor lists are evicted LRU
+# once the cached strings exceed MAX_BYTES
+NAME_LIST_CACHE = {
+    'MAX_BYTES': 8 * 1024 * 1024,
+}
+
+# Opt-in request profiling for staff users (see myapp/profiling.py): add
+# ?_profile=1 (or ?_profile=cprofile) or the X-Profile header to a URL; list
+# results at /internal/profiles/
+REQUEST_PROFILER = {
+    'ENABLED': True,
+    'DIR': BASE_DIR / 'profiles',
+    'MODE': 'sampling',
+    'INTERVAL': 0.001,
+    'KEEP': 50,
+}
+
+# Columnar snapshot for /api/snapshot/query/ (see myapp/columnar.py); built by
+# `python manage.py build_snapshot` and memory-mapped by the workers
+SNAPSHOT = {
+    'DIR': BASE_DIR / 'snapshot',
+    'MMAP': True,
+    'KEEP': 2,
+    'MIN_GROUP_SIZE': 5,
+}
+
+# Continual-release would-take-again counters (see myapp/continual.py): each
+# review event costs EPSILON; a tree holds 2**LEVELS - 1 events. Fill them for
+# existing reviews with `python manage.py backfill_counters`
+CONTINUAL_RELEASE = {
+    'EPSILON': 1.0,
+    'LEVELS': 8,
+}
+
+# Group-commit writer for WriteReview / delete_review (see myapp/writer.py):
+# concurrent writes are committed together, up to MAX_BATCH per transaction,
+# the first one waiting at most MAX_WAIT_MS for others
+REVIEW_WRITER = {
+    'ENABLED': True,
+    'MAX_BATCH': 64,
+    'MAX_WAIT_MS': 5,
+}
+
+# Gemini call layer (see myapp/llm.py): pooled keep-alive connections, a
+# hedged duplicate request once the first is slower than HEDGE_PERCENTILE of
+# recent requests, and a total deadline per call. Set BASE_URL to a local
+# `manage.py fake_gemini` server to test with injected latency.
+GEMINI_CALLS = {
+    'MODEL': 'gemini-2.5-flash',
+    'BASE_URL': os.environ.get("GEMINI_BASE_URL") or None,
+    'POOL_SIZE': 8,
+    'DEADLINE_MS': 15000,
+    'HEDGE_PERCENTILE': 0.95,
+    'HEDGE_DELAY_MS': 4000,
+    'HEDGE_BUDGET': 0.1,
+}